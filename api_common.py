@@ -0,0 +1,121 @@
+"""Pieces shared by the API's route modules: connections, SQL fragments and sales responses.
+
+app.py registers the lightweight routes itself; charts.py holds the chart and
+outlier routes and is imported on first use. Both build on what is here, which imports
+nothing heavy.
+"""
+from flask import current_app, jsonify, request
+import base64
+import json
+from chart_cache import ChartCache
+from classifier import MATCH_THRESHOLD
+from db import pool
+import metrics
+from units import DAY_TO_DATE_SQL
+
+# Rendered price-history charts; an entry goes stale as soon as its card's data_version moves
+chart_cache = ChartCache()
+
+# Upper bound on points in any rollup response, however long the card's history
+MAX_CHART_POINTS = 500
+
+# Sales lists page newest-first on (sale_day, id). Within a day id ascends, matching the
+# (card_id, sale_day DESC) index whose entries end in the rowid, so pages come straight off it.
+# The leading `sale_day <= ?` is what lets the planner seek that index to the cursor
+AFTER_CURSOR = 's.sale_day <= ? AND (s.sale_day < ? OR s.id > ?)'
+FIRST_CURSOR = (2 ** 31 - 1, 0)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Route SQL lives next to each route so check_query_plans.py can EXPLAIN exactly what the API runs
+CARD_ID = '(SELECT id FROM cards WHERE name = ?)'
+# Trigram FTS answers the substring LIKE from its index instead of scanning card names
+MATCHING_CARD_IDS = '(SELECT rowid FROM cards_fts WHERE name LIKE ?)'
+
+# Sales store integer cents and epoch days; responses keep dollars and ISO dates
+PRICE = 's.price_cents / 100.0 AS price'
+SALE_DATE = f"{DAY_TO_DATE_SQL.format('s.sale_day')} AS sale_date"
+SALE_COLUMNS = f's.id, s.sale_day, c.name AS card_name, {PRICE}, {SALE_DATE}, s.listing_url'
+
+# Sales whose titles matched their card at ingest (?matched=1). Spelled with the literal
+# threshold so the planner can answer it from the partial idx_sales_card_day_matched index
+MATCHED = f's.match_confidence >= {MATCH_THRESHOLD}'
+
+CARD_VERSION_SQL = '''
+    SELECT id, data_version
+    FROM cards
+    WHERE name = ?
+    '''
+
+def only_matched(sql):
+    """A route's sales query restricted to sales that matched their card"""
+    return sql.replace('\n    ORDER BY', f'\n      AND {MATCHED}\n    ORDER BY', 1)
+
+def wants_matched():
+    return request.args.get('matched') == '1'
+
+def get_db_connection():
+    # Each worker thread keeps one open connection; routes must not close it
+    return pool.connection()
+
+def phase(name):
+    """Time one phase (sql, serialize, pandas, plotly) of the current route"""
+    return metrics.timer('api_phase_seconds', route=request.endpoint, phase=name)
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row['sale_day'], row['id']]).encode()).decode()
+
+def decode_cursor(token):
+    """The (sale_day, id) a cursor token points after; FIRST_CURSOR when there is none"""
+    if not token:
+        return FIRST_CURSOR
+    try:
+        sale_day, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"Malformed cursor: {token}")
+    if not isinstance(sale_day, int) or not isinstance(row_id, int):
+        raise ValueError(f"Malformed cursor: {token}")
+    return sale_day, row_id
+
+def sale_dict(row):
+    """A sale as the API returns it, without the keyset columns"""
+    sale = dict(row)
+    del sale['id'], sale['sale_day']
+    return sale
+
+def stream_json_array(cursor):
+    """Yield a JSON array one row at a time, straight from the database cursor"""
+    yield '['
+    for i, row in enumerate(cursor):
+        yield (',' if i else '') + json.dumps(sale_dict(row))
+    yield ']'
+
+def sales_response(conn, sql, params, default_limit=-1):
+    """Serve a newest-first sales query as a cursor page, an NDJSON stream or a JSON array.
+
+    ?limit= or ?cursor= returns {'sales': [...], 'next_cursor': ...}; pass next_cursor back
+    to get the following page. ?format=ndjson streams one sale per line. Otherwise the first
+    `default_limit` sales (all when -1) are streamed as a JSON array. Streams read rows
+    from the cursor as they are sent, so memory use does not grow with the result.
+    """
+    try:
+        sale_day, row_id = decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    keyset = (sale_day, sale_day, row_id)
+    if request.args.get('format') == 'ndjson':
+        limit = request.args.get('limit', default_limit, type=int)
+        cursor = conn.execute(sql, params + keyset + (limit,))
+        return current_app.response_class((json.dumps(sale_dict(row)) + '\n' for row in cursor),
+                                          mimetype='application/x-ndjson')
+    if 'limit' in request.args or 'cursor' in request.args:
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        # One extra row tells us whether another page follows
+        with phase('sql'):
+            rows = conn.execute(sql, params + keyset + (limit + 1,)).fetchall()
+        return jsonify({
+            'sales': [sale_dict(row) for row in rows[:limit]],
+            'next_cursor': encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+        })
+    cursor = conn.execute(sql, params + keyset + (default_limit,))
+    return current_app.response_class(stream_json_array(cursor), mimetype='application/json')
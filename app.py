@@ -1,109 +1,246 @@
-from flask import Flask, render_template, jsonify
-import plotly
-import plotly.express as px
+from flask import Flask, render_template, jsonify, request, g
+from werkzeug.utils import cached_property, import_string
+import cProfile
 import json
-import sqlite3
-import pandas as pd
-from datetime import datetime, timedelta
+import os
+import random
+import time
+from api_common import (AFTER_CURSOR, CARD_ID, DEFAULT_PAGE_SIZE, FIRST_CURSOR, MATCHING_CARD_IDS,
+                        MAX_PAGE_SIZE, SALE_COLUMNS, chart_cache, get_db_connection, only_matched, phase,
+                        sales_response, wants_matched)
+from db import pool
+import dashboard
+import fair_value
+import metrics
+import series
+import storage
 
 app = Flask(__name__)
 
-def get_db_connection():
-    conn = sqlite3.connect('card_prices.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# Every worker brings the schema up to date the first time it opens its connection
+pool.on_open = storage.ensure_schema
+
+# Per-request cProfile, for staging: with API_PROFILING=1 a request carrying the
+# X-Profile header (or a PROFILE_SAMPLE_RATE fraction of all requests) is profiled
+# and its stats dumped to PROFILE_DIR. Streamed bodies are generated after the
+# profile stops, so those cover the route up to its first row.
+PROFILING = os.environ.get('API_PROFILING') == '1'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+LATEST_PRICES_SQL = f'''
+    SELECT {SALE_COLUMNS}
+    FROM sales s
+    JOIN cards c ON c.id = s.card_id
+    WHERE s.card_id = {CARD_ID}
+      AND {AFTER_CURSOR}
+    ORDER BY s.sale_day DESC, s.id
+    LIMIT ?
+    '''
+
+SALES_HISTORY_SQL = f'''
+    SELECT {SALE_COLUMNS}
+    FROM sales s
+    JOIN cards c ON c.id = s.card_id
+    WHERE s.card_id IN {MATCHING_CARD_IDS}
+      AND {AFTER_CURSOR}
+    ORDER BY s.sale_day DESC, s.id
+    LIMIT ?
+    '''
+
+MATCHED_LATEST_PRICES_SQL = only_matched(LATEST_PRICES_SQL)
+MATCHED_SALES_HISTORY_SQL = only_matched(SALES_HISTORY_SQL)
+
+# One primary-key read; the model is kept current at ingest (see fair_value.py)
+FAIR_VALUE_SQL = f'''
+    SELECT level, scale, weight, sale_count, last_day
+    FROM fair_value_models
+    WHERE card_id = {CARD_ID}
+    '''
+
+CARDS_SQL = '''
+    SELECT name AS card_name
+    FROM cards
+    ORDER BY name
+    '''
+
+# Sample parameters for each route's SQL, used when checking query plans (see also charts.ROUTE_QUERIES)
+ROUTE_QUERIES = {
+    'latest_prices': (LATEST_PRICES_SQL, ('victor_wembanyama',) + FIRST_CURSOR[:1] + FIRST_CURSOR + (6,)),
+    'sales_history': (SALES_HISTORY_SQL, ('%wembanyama%', 20000, 20000, 1000, DEFAULT_PAGE_SIZE)),
+    'latest_prices_matched': (MATCHED_LATEST_PRICES_SQL, ('victor_wembanyama',) + FIRST_CURSOR[:1] + FIRST_CURSOR + (6,)),
+    'sales_history_matched': (MATCHED_SALES_HISTORY_SQL, ('%wembanyama%', 20000, 20000, 1000, DEFAULT_PAGE_SIZE)),
+    'fair_value': (FAIR_VALUE_SQL, ('victor_wembanyama',)),
+    'get_cards': (CARDS_SQL, ()),
+    'dashboard_cards': (dashboard.dashboard_cards_sql(2), ('victor_wembanyama', 'luka_doncic')),
+    'dashboard_sales': (dashboard.dashboard_sales_sql(2), (1, 2)),
+    'dashboard_sales_matched': (dashboard.dashboard_sales_sql(2, matched=True), (1, 2)),
+    'dashboard_bounds': (dashboard.dashboard_bounds_sql(2), ('iqr', 1, 2)),
+}
+
+class LazyView:
+    """A view imported from `module.function` on its first request, not at startup"""
+
+    def __init__(self, import_name):
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, **kwargs):
+        return self.view(**kwargs)
+
+# charts.py (and numpy, and pandas and plotly for ?format=plotly) loads the first time one of these is hit
+for rule, endpoint in [
+    ('/api/price-history/<card_name>', 'price_history'),
+    ('/api/price-rollups/<card_name>', 'price_rollups'),
+    ('/api/sales-history-no-outliers/<card_name>', 'sales_history_no_outliers'),
+]:
+    app.add_url_rule(rule, endpoint, view_func=LazyView(f'charts.{endpoint}'))
+
+def collect_app_gauges():
+    for name, value in chart_cache.stats().items():
+        yield f'chart_cache_{name}', {}, value
+    for name, value in pool.stats().items():
+        if name != 'path':
+            yield f'db_pool_{name}', {}, value
+
+metrics.REGISTRY.add_collector(collect_app_gauges)
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    g.profiler = None
+    if PROFILING and (PROFILE_HEADER in request.headers or random.random() < PROFILE_SAMPLE_RATE):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('api_request_seconds', time.perf_counter() - g.started, route=route)
+    metrics.inc('api_requests_total', route=route, status=response.status_code)
+    if g.profiler is not None:
+        g.profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{request.endpoint}-{time.time_ns()}.prof")
+        g.profiler.dump_stats(path)
+        response.headers['X-Profile-File'] = path
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/price-history/<card_name>')
-def price_history(card_name):
-    conn = get_db_connection()
-    query = '''
-    SELECT price, sale_date as timestamp
-    FROM card_prices
-    WHERE card_name = ?
-    ORDER BY sale_date DESC
-    '''
-    data = conn.execute(query, (card_name,)).fetchall()
-    conn.close()
-    
-    df = pd.DataFrame(data)
-    if not df.empty:
-        fig = px.line(df, x='timestamp', y='price',
-                      title=f'Price History for {card_name}',
-                      labels={'price': 'Price (USD)', 'timestamp': 'Date'})
-        return jsonify(fig.to_dict())
-    return jsonify({'error': 'No data found'})
-
 @app.route('/api/latest-prices/<card_name>')
 def latest_prices(card_name):
     conn = get_db_connection()
-    query = '''
-    SELECT card_name, price, sale_date, listing_url
-    FROM card_prices
-    WHERE card_name = ?
-    ORDER BY sale_date DESC
-    LIMIT 6
-    '''
-    data = conn.execute(query, (card_name,)).fetchall()
-    conn.close()
-    
-    return jsonify([dict(row) for row in data])
+    sql = MATCHED_LATEST_PRICES_SQL if wants_matched() else LATEST_PRICES_SQL
+    return sales_response(conn, sql, (card_name,), default_limit=6)
 
 @app.route('/api/sales-history/<card_name>')
 def sales_history(card_name):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT DISTINCT card_name FROM card_prices')
-    all_cards = [row[0] for row in cursor.fetchall()]
-    
     search_pattern = f'%{card_name}%'
-    
-    query = '''
-    SELECT card_name, price, sale_date, listing_url
-    FROM card_prices
-    WHERE card_name LIKE ?
-    ORDER BY sale_date DESC
-    '''
-    data = cursor.execute(query, (search_pattern,)).fetchall()
-    
-    conn.close()
-    return jsonify([dict(row) for row in data])
+    sql = MATCHED_SALES_HISTORY_SQL if wants_matched() else SALES_HISTORY_SQL
+    return sales_response(conn, sql, (search_pattern,))
+
+@app.route('/api/dashboard')
+def dashboard_data():
+    """Chart series, latest sales and history for many cards in one response.
+
+    ?cards=a,b,c (or repeated ?card=) names the cards. ?history=no-outliers filters
+    the history with ?method= bounds; ?latest= and ?history_limit= size the lists.
+    ?matched=1 leaves out sales whose titles did not match their card (see classifier.py).
+    Series are columnar (see series.py); ?encoding=delta delta-encodes them.
+    The ETag changes only when one of the cards gets new sales, so a client
+    revalidating an unchanged dashboard gets a 304 without any sales being read.
+    """
+    names = [name for value in request.args.getlist('cards') for name in value.split(',') if name]
+    names = list(dict.fromkeys(names + request.args.getlist('card')))
+    if not names or len(names) > dashboard.MAX_DASHBOARD_CARDS:
+        return jsonify({'error': f"pass 1 to {dashboard.MAX_DASHBOARD_CARDS} card names in ?cards="}), 400
+    method = None
+    if request.args.get('history') == 'no-outliers':
+        # outliers needs numpy; only load it once someone asks for filtered history
+        from outliers import DEFAULT_METHOD, METHODS
+        method = request.args.get('method', DEFAULT_METHOD)
+        if method not in METHODS:
+            return jsonify({'error': f"method must be one of {', '.join(METHODS)}"}), 400
+    encoding = request.args.get('encoding', 'plain')
+    if encoding not in series.ENCODINGS:
+        return jsonify({'error': f"encoding must be one of {', '.join(series.ENCODINGS)}"}), 400
+    latest = max(0, min(request.args.get('latest', dashboard.DEFAULT_LATEST, type=int), MAX_PAGE_SIZE))
+    history = max(0, min(request.args.get('history_limit', dashboard.DEFAULT_HISTORY, type=int),
+                         dashboard.MAX_HISTORY))
 
-@app.route('/api/sales-history-no-outliers/<card_name>')
-def sales_history_no_outliers(card_name):
     conn = get_db_connection()
-    df = pd.read_sql_query(
-        "SELECT card_name, price, sale_date, listing_url FROM card_prices WHERE card_name LIKE ? ORDER BY sale_date DESC",
+    with phase('sql'):
+        cards = dashboard.load_cards(conn, names)
+    content_encoding = series.content_encoding(request.headers.get('Accept-Encoding'))
+    matched = wants_matched()
+    tag = dashboard.etag(cards, [names, method, latest, history, encoding, matched, content_encoding])
+    if request.if_none_match.contains(tag):
+        response = app.response_class(status=304)
+    else:
+        with phase('sql'):
+            data = dashboard.load_dashboard(conn, cards, latest, history, method, encoding, matched)
+        with phase('serialize'):
+            body = json.dumps({'cards': data, 'missing': [name for name in names if name not in cards]},
+                              separators=(',', ':')).encode()
+            body, applied = series.compress(body, content_encoding)
+        response = app.response_class(body, mimetype='application/json')
+        if applied:
+            response.headers['Content-Encoding'] = applied
+    response.vary.add('Accept-Encoding')
+    response.set_etag(tag)
+    # Browsers revalidate every time, and the ETag makes that cheap
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/fair-value/<card_name>')
+def card_fair_value(card_name):
+    conn = get_db_connection()
+    with phase('sql'):
+        model = conn.execute(FAIR_VALUE_SQL, (card_name,)).fetchone()
+    if model is None:
+        return jsonify({'error': 'No data found'})
+    return jsonify({'card_name': card_name, **fair_value.describe(*model)})
+
+@app.route('/api/undervalued')
+def undervalued():
+    # Scoring needs numpy and the scrape stack; load them on first use
+    from undervalued import score_listings
+    conn = get_db_connection()
+    deals = score_listings(
         conn,
-        params=(f'%{card_name}%',)
+        min_discount=request.args.get('min_discount', 0.2, type=float),
+        limit=min(request.args.get('limit', 50, type=int), 500),
+        card_name=request.args.get('card')
     )
-    conn.close()
-    if not df.empty:
-        # Remove outliers using IQR
-        Q1 = df['price'].quantile(0.25)
-        Q3 = df['price'].quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        df = df[(df['price'] >= lower) & (df['price'] <= upper)]
-    return jsonify(df.to_dict(orient='records'))
+    return jsonify(deals)
 
 @app.route('/api/cards')
 def get_cards():
     conn = get_db_connection()
-    query = '''
-    SELECT DISTINCT card_name
-    FROM card_prices
-    ORDER BY card_name
-    '''
-    data = conn.execute(query).fetchall()
-    conn.close()
-    
+    with phase('sql'):
+        data = conn.execute(CARDS_SQL).fetchall()
+
     return jsonify([row['card_name'] for row in data])
 
+@app.route('/api/db-stats')
+def db_stats():
+    return jsonify(pool.stats())
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    return jsonify(chart_cache.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    app.run(debug=True)
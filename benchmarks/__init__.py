@@ -0,0 +1 @@
+"""Offline benchmarks; run the modules with python -m benchmarks.<name>"""
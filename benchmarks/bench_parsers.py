@@ -0,0 +1,57 @@
+"""Compare parser backends on saved eBay result pages.
+
+Usage: python -m benchmarks.bench_parsers [--pages-dir DIR] [--seconds N]
+"""
+import argparse
+import time
+
+from benchmarks.ebay_fixtures import PAGES_DIR, load_pages
+from parsers import PARSERS, available_parsers
+
+
+def bench_backend(parse, pages, seconds):
+    """Parse the pages repeatedly for about `seconds` and return pages/sec"""
+    parsed = 0
+    start = time.perf_counter()
+    while True:
+        for html in pages:
+            parse(html)
+        parsed += len(pages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return parsed / elapsed
+
+
+def run(pages_dir=PAGES_DIR, seconds=2.0):
+    """Benchmark every available backend and check that they all extract the same items"""
+    pages = load_pages(pages_dir)
+    reference = [PARSERS['soup'](html) for html in pages]
+    results = {}
+    for name in available_parsers():
+        parse = PARSERS[name]
+        if [parse(html) for html in pages] != reference:
+            raise AssertionError(f"Parser backend '{name}' disagrees with the soup reference")
+        results[name] = bench_backend(parse, pages, seconds)
+    return {
+        'pages': len(pages),
+        'items_per_page': sum(len(items) for items in reference) / len(pages),
+        'pages_per_sec': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages-dir', default=PAGES_DIR)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    report = run(args.pages_dir, args.seconds)
+    print(f"{report['pages']} pages, {report['items_per_page']:.1f} items/page")
+    print("=" * 40)
+    baseline = report['pages_per_sec']['soup']
+    for name, rate in sorted(report['pages_per_sec'].items(), key=lambda kv: -kv[1]):
+        print(f"{name:<8} {rate:>10.1f} pages/sec  ({rate / baseline:.1f}x soup)")
+
+
+if __name__ == '__main__':
+    main()
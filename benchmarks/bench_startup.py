@@ -0,0 +1,100 @@
+"""Measure the startup cost of each entry point: import time and resident memory.
+
+Every measurement runs in a fresh interpreter, the way a gunicorn worker or a cron
+run of the scraper starts. Modules listed in HEAVY_MODULES must not be imported at
+startup by the API, and the run fails if one is, so boot cost cannot creep back up
+unnoticed.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--max-seconds S] [--max-rss-mb MB]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ['app', 'simple_scraper', 'daemon']
+
+# Loaded on first use only; importing any of these at API startup is a regression
+HEAVY_MODULES = {
+    'app': ['pandas', 'plotly', 'numpy', 'bs4', 'lxml', 'requests', 'parsers', 'charts'],
+}
+
+MEASURE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': seconds,
+    'rss_kb': rss // 1024 if sys.platform == 'darwin' else rss,
+    'loaded': sorted(name for name in {watch!r} if name in sys.modules),
+}}))
+'''
+
+
+def measure(module, watch, workdir):
+    """Import `module` in a fresh interpreter and return its timing, peak RSS and heavy imports"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    # Run outside the repo so entry points that open logs or databases on import leave it alone
+    output = subprocess.check_output(
+        [sys.executable, '-c', MEASURE.format(module=module, watch=watch)], cwd=workdir, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs=5):
+    """Median import seconds and peak RSS (MB) per entry point over `runs` fresh interpreters"""
+    watch = sorted({name for names in HEAVY_MODULES.values() for name in names})
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for module in ENTRY_POINTS:
+            samples = [measure(module, watch, workdir) for _ in range(runs)]
+            results[module] = {
+                'import_seconds': round(statistics.median(s['seconds'] for s in samples), 4),
+                'rss_mb': round(statistics.median(s['rss_kb'] for s in samples) / 1024, 1),
+                'heavy_modules_loaded': samples[-1]['loaded'],
+            }
+    return results
+
+
+def regressions(results, max_seconds=None, max_rss_mb=None):
+    """Human-readable problems with the API's startup, empty when it is within budget"""
+    problems = []
+    for module, forbidden in HEAVY_MODULES.items():
+        loaded = sorted(set(results[module]['heavy_modules_loaded']) & set(forbidden))
+        if loaded:
+            problems.append(f"{module} imports {', '.join(loaded)} at startup")
+    api = results['app']
+    if max_seconds is not None and api['import_seconds'] > max_seconds:
+        problems.append(f"app takes {api['import_seconds']}s to import (budget {max_seconds}s)")
+    if max_rss_mb is not None and api['rss_mb'] > max_rss_mb:
+        problems.append(f"app starts at {api['rss_mb']} MB RSS (budget {max_rss_mb} MB)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None, help='fail if importing app takes longer')
+    parser.add_argument('--max-rss-mb', type=float, default=None, help='fail if a fresh API worker uses more')
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(f"{'entry point':<16} {'import':>9} {'RSS':>9}  heavy modules loaded")
+    print("=" * 60)
+    for module, result in results.items():
+        print(f"{module:<16} {result['import_seconds']:>8.3f}s {result['rss_mb']:>6.1f} MB  "
+              f"{', '.join(result['heavy_modules_loaded']) or '-'}")
+    problems = regressions(results, args.max_seconds, args.max_rss_mb)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""eBay-shaped search result pages for offline benchmarks.
+
+Real pages saved from eBay (File > Save Page As, HTML only) can be dropped into
+benchmarks/pages/ and are preferred; when that directory is empty the pages are
+generated with the same markup structure the parsers look for.
+"""
+import glob
+import os
+import random
+from datetime import date, timedelta
+from html import escape
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+PLAYERS = [
+    'Victor Wembanyama', 'Luka Doncic', 'Anthony Edwards', 'Paolo Banchero',
+    'Chet Holmgren', 'LaMelo Ball', 'Zion Williamson', 'Ja Morant'
+]
+PARALLELS = ['Silver Prizm', 'Base', 'Red White Blue', 'Hyper', 'Green Prizm', 'Mojo']
+GRADES = ['PSA 10', 'PSA 9', 'BGS 9.5', 'SGC 10', 'Raw']
+
+# Roughly what surrounds the results on a real page: inline scripts, styles and nav
+PAGE_CHROME = (
+    '<script>window.SRP={"config":"' + 'x' * 4000 + '"};</script>'
+    '<style>' + '.s-item__wrapper{display:flex}' * 200 + '</style>'
+    '<nav class="srp-controls">' + '<a class="srp-refine" href="/sch/?k=v">Refine</a>' * 150 + '</nav>'
+)
+
+
+def result_item(listing_id, title, price, sold_on=None, price_range=False):
+    """Markup for one li.s-item, mirroring eBay's sold-listing layout"""
+    price_text = f"${price:,.2f} to ${price * 1.4:,.2f}" if price_range else f"${price:,.2f}"
+    caption = ''
+    if sold_on:
+        caption = (
+            '<div class="s-item__caption-section"><span class="s-item__caption--signal POSITIVE">'
+            f'<span>Sold  {sold_on.strftime("%b")} {sold_on.day}, {sold_on.year}</span></span></div>'
+        )
+    return (
+        '<li class="s-item s-item__pl-on-bottom" data-viewport=\'{"trackableId":"x"}\'>'
+        '<div class="s-item__wrapper clearfix"><div class="s-item__image-section">'
+        f'<img src="https://i.ebayimg.com/thumbs/images/g/{listing_id}/s-l140.jpg" alt="">'
+        '</div><div class="s-item__info clearfix">'
+        f'<a class="s-item__link" href="https://www.ebay.com/itm/{listing_id}?hash=item{listing_id:x}:g:abc&amp;amdata=enc%3A1">'
+        f'<div class="s-item__title"><span role="heading" aria-level="3">{escape(title)}</span></div></a>'
+        f'{caption}<div class="s-item__details clearfix"><div class="s-item__detail s-item__detail--primary">'
+        f'<span class="s-item__price">{price_text}</span></div>'
+        '<div class="s-item__detail s-item__detail--primary"><span class="s-item__shipping">+$5.00 shipping</span></div>'
+        '</div></div></div></li>'
+    )
+
+
+def sold_results_page(page=1, per_page=60, seed=0, newest=None, sold=True):
+    """Build one search result page; listing IDs and dates are stable for a (seed, page) pair"""
+    rng = random.Random(seed * 100003 + page)
+    newest = newest or date(2025, 7, 20)
+    # eBay always prepends a "Shop on eBay" placeholder with no caption or real link
+    items = ['<li class="s-item"><div class="s-item__title"><span>Shop on eBay</span></div>'
+             '<span class="s-item__price">$20.00</span></li>']
+    for i in range(per_page):
+        listing_id = 1_000_000_000_00 + seed * 1_000_000 + page * 1000 + i
+        title = (f"2023 Panini Prizm {rng.choice(PLAYERS)} #{rng.randint(1, 300)} "
+                 f"{rng.choice(PARALLELS)} RC {rng.choice(GRADES)}")
+        price = round(rng.lognormvariate(5, 0.6), 2)
+        sold_on = newest - timedelta(days=(page - 1) * 7 + i // 9) if sold else None
+        items.append(result_item(listing_id, title, price, sold_on, price_range=rng.random() < 0.02))
+    return ('<!DOCTYPE html><html><head><title>eBay</title></head><body>' + PAGE_CHROME +
+            '<ul class="srp-results srp-list clearfix">' + ''.join(items) + '</ul></body></html>')
+
+
+def load_pages(pages_dir=PAGES_DIR, count=20):
+    """Return saved pages from `pages_dir`, or `count` generated ones if none are saved"""
+    paths = sorted(glob.glob(os.path.join(pages_dir, '*.html')))
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+        return pages
+    return [sold_results_page(page) for page in range(1, count + 1)]
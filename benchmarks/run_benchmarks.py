@@ -0,0 +1,185 @@
+"""Repeatable offline benchmarks for startup, the scraper, parser, ingest path and API.
+
+Nothing here touches eBay: scraping runs against the local stand-in server and the
+API runs against a synthetic database. Results are written as JSON so runs from
+different releases can be compared.
+Usage: python -m benchmarks.run_benchmarks [--rows 200000] [--output FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import db
+from benchmarks import bench_parsers, bench_startup, synth_data
+from benchmarks.stand_in_server import start_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+        'requests': len(samples),
+    }
+
+
+def bench_scrape(workdir, cards=20, pages=5, latency=0.05):
+    """Pages/sec for get_ebay_sales_multiple_pages against the stand-in server"""
+    import simple_scraper
+    from scrape_engine import CardQuery, ScrapeEngine
+
+    server, config, url = start_server(latency=latency, pages=pages)
+    db.DB_PATH = os.path.join(workdir, 'scrape.db')
+    queries = [CardQuery(f"bench card {i}", f"bench card {i}") for i in range(cards)]
+    engine = ScrapeEngine(base_url=url, rate=1000, burst=100, max_per_host=16, max_workers=16)
+    started = time.perf_counter()
+    simple_scraper.get_ebay_sales_multiple_pages(max_pages=pages + 1, queries=queries,
+                                                 engine=engine, incremental=False)
+    elapsed = time.perf_counter() - started
+    engine.close()
+    server.shutdown()
+    return {
+        'cards': cards,
+        'requests': config.requests,
+        'latency_ms': latency * 1000,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(config.requests / elapsed, 2),
+    }
+
+
+def bench_sharded(workdir, cards=40, pages=5, latency=0.05, workers=(1, 2, 4)):
+    """Pages/sec for sharded.run_sharded with each worker count, against the stand-in server"""
+    import sharded
+    from scrape_engine import CardQuery
+
+    server, config, url = start_server(latency=latency, pages=pages)
+    queries = [CardQuery(f"bench card {i}", f"bench card {i}") for i in range(cards)]
+    # No page cache, so every run fetches every page
+    options = {'base_url': url, 'rate': 1000.0, 'burst': 100, 'max_per_host': 16, 'max_workers': 16, 'cache': None}
+    results = {}
+    for count in workers:
+        requests = config.requests
+        started = time.perf_counter()
+        sharded.run_sharded(queries, workers=count, max_pages=pages + 1, incremental=False,
+                            path=os.path.join(workdir, f'sharded-{count}.db'), engine_options=options)
+        elapsed = time.perf_counter() - started
+        results[count] = {
+            'seconds': round(elapsed, 3),
+            'pages_per_sec': round((config.requests - requests) / elapsed, 2),
+        }
+    server.shutdown()
+    return {'cards': cards, 'latency_ms': latency * 1000, 'cpus': os.cpu_count(), 'workers': results}
+
+
+def bench_insert(workdir, rows=50000, cards=50):
+    """Rows/sec through SalesWriter, including rollups and the outlier refresh on close"""
+    import storage
+
+    conn = storage.connect(os.path.join(workdir, 'insert.db'))
+    started = time.perf_counter()
+    with storage.SalesWriter(conn) as writer:
+        for n in range(rows):
+            writer.add(f"insert card {n % cards}", f"Listing {n}", 100 + n % 97,
+                       f"2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}", f"https://www.ebay.com/itm/{800000000000 + n}")
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_sec': round(rows / elapsed, 1)}
+
+
+def bench_routes(path, requests=200):
+    """p50/p99 latency of each API route against the synthetic database"""
+    db.DB_PATH = path
+    db.pool.close_all()
+    from app import app, chart_cache
+
+    card = synth_data.card_name(0)
+    routes = {
+        'price_history': f"/api/price-history/{card}",
+        'price_history_rollup': f"/api/price-history/{card}?resolution=auto",
+        'price_history_plotly': f"/api/price-history/{card}?format=plotly",
+        'price_rollups': f"/api/price-rollups/{card}?resolution=week",
+        'latest_prices': f"/api/latest-prices/{card}",
+        'fair_value': f"/api/fair-value/{card}",
+        'sales_history': "/api/sales-history/card 0001",
+        'sales_history_no_outliers': "/api/sales-history-no-outliers/card 0001",
+        'undervalued': "/api/undervalued",
+        'cards': "/api/cards",
+    }
+    client = app.test_client()
+    results = {}
+    for name, url in routes.items():
+        client.get(url)  # warm the connection and statement cache
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+        results[name] = dict(percentiles(samples), status=response.status_code, bytes=len(response.data))
+
+    # The chart route again with the cache emptied before every request
+    samples = []
+    for _ in range(max(10, requests // 10)):
+        chart_cache.clear()
+        started = time.perf_counter()
+        client.get(routes['price_history'])
+        samples.append(time.perf_counter() - started)
+    results['price_history_uncached'] = percentiles(samples)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows=200000, requests=200, parse_seconds=2.0):
+    with tempfile.TemporaryDirectory() as workdir:
+        synth_path = os.path.join(workdir, 'synthetic.db')
+        synth_seconds = synth_data.generate(synth_path, rows=rows)
+        return {
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'startup': bench_startup.run(),
+            'parse': bench_parsers.run(seconds=parse_seconds),
+            'scrape': bench_scrape(workdir),
+            'scrape_sharded': bench_sharded(workdir),
+            'insert': bench_insert(workdir),
+            'synthetic_db': {'rows': rows, 'generate_seconds': round(synth_seconds, 2)},
+            'routes': bench_routes(synth_path, requests),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help='rows in the synthetic database')
+    parser.add_argument('--requests', type=int, default=200, help='requests per API route')
+    parser.add_argument('--parse-seconds', type=float, default=2.0)
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+
+    report = run(args.rows, args.requests, args.parse_seconds)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Local stand-in for eBay search so scraper benchmarks never touch the network.
+
+Serves saved pages from benchmarks/pages/ (or generated ones) for /sch/i.html with
+configurable latency, a fixed number of result pages per query and a share of
+429 responses. Usage: python -m benchmarks.stand_in_server [--port 8765] [--latency-ms 50]
+"""
+import argparse
+import glob
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.ebay_fixtures import PAGES_DIR, sold_results_page
+
+EMPTY_PAGE = '<html><body><ul class="srp-results srp-list clearfix"></ul></body></html>'
+
+
+class StandInConfig:
+    def __init__(self, latency=0.05, pages=5, error_rate=0.0, pages_dir=PAGES_DIR, seed=0):
+        self.latency = latency
+        self.pages = pages
+        self.error_rate = error_rate
+        self.saved_pages = sorted(glob.glob(os.path.join(pages_dir, '*.html')))
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+
+    def should_throttle(self):
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.throttled += 1
+                return True
+            return False
+
+    def page_body(self, terms, page):
+        """Results for one page: a saved page if any exist, else a generated one unique to the query"""
+        if page > self.pages:
+            return EMPTY_PAGE
+        if self.saved_pages:
+            with open(self.saved_pages[(page - 1) % len(self.saved_pages)], encoding='utf-8', errors='replace') as f:
+                return f.read()
+        seed = int(hashlib.sha1(terms.encode()).hexdigest()[:6], 16)
+        return sold_results_page(page, seed=seed)
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(config.latency)
+            if config.should_throttle():
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            query = parse_qs(urlsplit(self.path).query)
+            page = int(query.get('_pgn', ['1'])[0])
+            body = config.page_body(query.get('_nkw', [''])[0], page).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(port=0, **config):
+    """Start the stand-in on a background thread; returns (server, config, search_url)"""
+    config = StandInConfig(**config)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config, f"http://127.0.0.1:{server.server_address[1]}/sch/i.html"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--pages', type=int, default=5, help='result pages per query before results run out')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 429')
+    args = parser.parse_args()
+
+    server, config, url = start_server(args.port, latency=args.latency_ms / 1000,
+                                       pages=args.pages, error_rate=args.error_rate)
+    print(f"Serving eBay stand-in at {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
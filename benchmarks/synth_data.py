@@ -0,0 +1,86 @@
+"""Generate a synthetic sales database with any number of rows.
+
+Rows are bulk-inserted straight into the migrated schema and the derived tables
+(rollups, outlier bounds, fair-value models) are rebuilt once at the end, so millions of rows take
+seconds rather than going through the scraper's per-batch ingest path.
+Usage: python -m benchmarks.synth_data PATH [--rows 1000000] [--cards 200]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import classifier
+import fair_value
+import outliers
+import rollups
+import storage
+from units import to_day
+
+CHUNK = 50000
+
+
+def card_name(i):
+    return f"synthetic card {i:04d} prizm silver psa 10"
+
+
+def generate(path, rows=1000000, cards=200, days=730, seed=0):
+    """Fill `path` with `rows` sales spread over `cards` cards and the last `days` days"""
+    rng = random.Random(seed)
+    conn = storage.connect(path)
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO cards (name) VALUES (?)", [(card_name(i),) for i in range(cards)])
+    names = {card_id: name for card_id, name in conn.execute("SELECT id, name FROM cards")}
+    ids = {name: card_id for card_id, name in names.items()}
+    card_ids = [ids[card_name(i)] for i in range(cards)]
+    # Each card gets its own price level and trend so rollups and bounds have something to do
+    levels = {card_id: rng.lognormvariate(5, 1) for card_id in card_ids}
+    trends = {card_id: rng.uniform(-0.5, 1.0) for card_id in card_ids}
+    # Outlier sales get the titles that usually explain them: a lot or a lower grade
+    titles = {card_id: [names[card_id], f"lot of 3 {names[card_id]}", names[card_id].replace('psa 10', 'psa 9')]
+              for card_id in card_ids}
+    classes = {card_id: classifier.classify_titles(names[card_id], titles[card_id]) for card_id in card_ids}
+    start = to_day(date.today() - timedelta(days=days))
+    scraped = int(time.time())
+
+    started = time.perf_counter()
+    with conn:
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0] + 1
+        for offset in range(0, rows, CHUNK):
+            batch = []
+            for n in range(next_id + offset, next_id + min(offset + CHUNK, rows)):
+                card_id = rng.choice(card_ids)
+                age = rng.randrange(days)
+                price = levels[card_id] * (1 + trends[card_id] * age / days) * rng.lognormvariate(0, 0.25)
+                variant = 0
+                if rng.random() < 0.01:
+                    variant = rng.choice([1, 2])
+                    price *= 8 if variant == 1 else 0.1
+                listing_id = str(900000000000 + n)
+                batch.append((
+                    card_id, start + age, round(price * 100), scraped, listing_id,
+                    titles[card_id][variant], f"https://www.ebay.com/itm/{listing_id}", *classes[card_id][variant]
+                ))
+            conn.executemany(storage.INSERT_SALE_SQL, batch)
+        rollups.rebuild(conn, card_ids)
+        outliers.rebuild(conn)
+        fair_value.rebuild(conn)
+        conn.execute("UPDATE cards SET data_version = data_version + 1")
+    conn.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--cards', type=int, default=200)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    elapsed = generate(args.path, args.rows, args.cards, args.days, args.seed)
+    print(f"Wrote {args.rows} rows for {args.cards} cards to {args.path} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
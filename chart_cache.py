@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+
+class ChartCache:
+    """LRU cache of rendered chart payloads keyed by (card, data_version), capped by total size.
+
+    Only the newest version of a card is kept: storing a new version drops the old one,
+    so a scraper commit invalidates a card's chart the next time it is requested.
+    Payloads are (content_encoding, body) pairs, so a cached body is always served with
+    the encoding it was stored with; only the body counts towards the size cap.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, card_name, version):
+        key = (card_name, version)
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, card_name, version, payload):
+        size = len(payload[1])
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            stale = self.versions.get(card_name)
+            if stale is not None:
+                self._drop((card_name, stale))
+            self.entries[(card_name, version)] = payload
+            self.versions[card_name] = version
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        """Remove one entry; caller holds the lock"""
+        payload = self.entries.pop(key, None)
+        if payload is not None:
+            self.size -= len(payload[1])
+            if self.versions.get(key[0]) == key[1]:
+                del self.versions[key[0]]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,194 @@
+"""Chart and outlier-filtered routes, kept out of app.py's startup path.
+
+app.py registers these views lazily, so this module is only imported by the first
+request that reaches one of them. Charts are served as compact columnar series
+(see series.py); the legacy plotly figure (?format=plotly) imports pandas and
+plotly only when it is asked for.
+"""
+from flask import current_app, jsonify, request
+import series
+from api_common import (AFTER_CURSOR, CARD_ID, CARD_VERSION_SQL, FIRST_CURSOR, MATCHING_CARD_IDS,
+                        MAX_CHART_POINTS, PRICE, SALE_COLUMNS, chart_cache, get_db_connection,
+                        only_matched, phase, sales_response, wants_matched)
+from outliers import DEFAULT_METHOD, METHODS
+from rollups import RESOLUTIONS
+from units import DAY_TO_DATE_SQL
+
+PRICE_HISTORY_SQL = f'''
+    SELECT {PRICE}, {DAY_TO_DATE_SQL.format('s.sale_day')} AS timestamp
+    FROM sales s
+    WHERE s.card_id = {CARD_ID}
+    ORDER BY s.sale_day DESC
+    '''
+
+# Bounds are precomputed per card at ingest; the join picks the period a sale falls in
+SALES_NO_OUTLIERS_SQL = f'''
+    SELECT {SALE_COLUMNS}
+    FROM sales s
+    JOIN cards c ON c.id = s.card_id
+    JOIN outlier_bounds b
+      ON b.card_id = s.card_id
+     AND b.method = ?
+     AND s.sale_day BETWEEN b.period_start AND b.period_end
+    WHERE s.card_id IN {MATCHING_CARD_IDS}
+      AND s.price_cents BETWEEN b.lower * 100 AND b.upper * 100
+      AND {AFTER_CURSOR}
+    ORDER BY s.sale_day DESC, s.id
+    LIMIT ?
+    '''
+MATCHED_SALES_NO_OUTLIERS_SQL = only_matched(SALES_NO_OUTLIERS_SQL)
+
+ROLLUP_SQL = '''
+    SELECT bucket_start, sale_count, min_price, max_price,
+           mean_price, median_price, trimmed_mean_price
+    FROM price_rollups
+    WHERE card_id = ? AND resolution = ?
+    ORDER BY bucket_start DESC
+    LIMIT ?
+    '''
+
+ROLLUP_COUNTS_SQL = '''
+    SELECT resolution, COUNT(*) AS buckets
+    FROM price_rollups
+    WHERE card_id = ?
+    GROUP BY resolution
+    '''
+
+# Sample parameters for each route's SQL, used when checking query plans
+ROUTE_QUERIES = {
+    'price_history': (PRICE_HISTORY_SQL, ('victor_wembanyama',)),
+    'price_history_series': (series.RAW_SERIES_SQL, (1,)),
+    'sales_history_no_outliers': (SALES_NO_OUTLIERS_SQL, ('iqr', '%wembanyama%') + FIRST_CURSOR[:1] + FIRST_CURSOR + (-1,)),
+    'sales_history_no_outliers_matched': (MATCHED_SALES_NO_OUTLIERS_SQL,
+                                          ('iqr', '%wembanyama%') + FIRST_CURSOR[:1] + FIRST_CURSOR + (-1,)),
+    'price_rollups': (ROLLUP_SQL, (1, 'week', MAX_CHART_POINTS)),
+}
+
+def render_price_history(card_name, data):
+    import pandas as pd
+    import plotly.express as px
+    with phase('pandas'):
+        df = pd.DataFrame([dict(row) for row in data])
+    if df.empty:
+        return None
+    with phase('plotly'):
+        fig = px.line(df, x='timestamp', y='price',
+                      title=f'Price History for {card_name}',
+                      labels={'price': 'Price (USD)', 'timestamp': 'Date'})
+        return fig.to_json()
+
+def render_rollup_history(card_name, resolution, data):
+    import pandas as pd
+    import plotly.express as px
+    with phase('pandas'):
+        df = pd.DataFrame([dict(row) for row in data])
+    if df.empty:
+        return None
+    with phase('plotly'):
+        fig = px.line(df, x='bucket_start', y=['min_price', 'median_price', 'max_price'],
+                      title=f'Price History for {card_name} (by {resolution})',
+                      labels={'value': 'Price (USD)', 'bucket_start': 'Date', 'variable': ''})
+        return fig.to_json()
+
+def rollup_params(conn, card_id):
+    """Resolve ?resolution= and ?points= into a rollup resolution and row limit.
+
+    resolution=auto picks the finest resolution whose whole history fits in `points`.
+    """
+    resolution = request.args.get('resolution', 'auto')
+    points = max(1, min(request.args.get('points', MAX_CHART_POINTS, type=int), MAX_CHART_POINTS))
+    if resolution == 'auto':
+        counts = {row['resolution']: row['buckets'] for row in conn.execute(ROLLUP_COUNTS_SQL, (card_id,))}
+        resolution = next((r for r in RESOLUTIONS if counts.get(r, 0) <= points), RESOLUTIONS[-1])
+    elif resolution not in RESOLUTIONS:
+        return None, points
+    return resolution, points
+
+def render_series(card_name, resolution, conn, card_id, points, encoding):
+    """Series payload bytes straight from SQLite rows; None when the card has no points"""
+    with phase('sql'):
+        if resolution == 'raw':
+            columns = series.raw_columns(conn, card_id)
+        else:
+            columns = series.rollup_columns(conn.execute(ROLLUP_SQL, (card_id, resolution, points)).fetchall())
+    if not columns['days']:
+        return None
+    with phase('serialize'):
+        return series.payload(card_name, resolution, columns, encoding)
+
+def price_history(card_name):
+    """Chart data for a card: every sale, or rollups with ?resolution=.
+
+    Returns a columnar series (?encoding=delta to delta-encode it), compressed when
+    the client accepts br or gzip. ?format=plotly returns the old full plotly figure.
+    """
+    conn = get_db_connection()
+    card = conn.execute(CARD_VERSION_SQL, (card_name,)).fetchone()
+    if card is None:
+        return jsonify({'error': 'No data found'})
+    fmt = request.args.get('format', 'series')
+    encoding = request.args.get('encoding', 'plain')
+    if fmt not in ('series', 'plotly') or encoding not in series.ENCODINGS:
+        return jsonify({'error': f"format must be series or plotly, encoding one of {', '.join(series.ENCODINGS)}"}), 400
+    
+    # ?resolution= charts the rollups instead of every raw sale
+    resolution, points = 'raw', None
+    if 'resolution' in request.args:
+        resolution, points = rollup_params(conn, card['id'])
+        if resolution is None:
+            return jsonify({'error': f"resolution must be auto or one of {', '.join(RESOLUTIONS)}"}), 400
+    content_encoding = series.content_encoding(request.headers.get('Accept-Encoding')) if fmt == 'series' else None
+    cache_key = f'{card_name}?resolution={resolution}&points={points}&format={fmt}&encoding={encoding}|{content_encoding}'
+    
+    # Repeat loads of an unchanged card skip the database and serialization entirely
+    cached = chart_cache.get(cache_key, card['data_version'])
+    if cached is None:
+        if fmt == 'series':
+            body = render_series(card_name, resolution, conn, card['id'], points, encoding)
+            if body is None:
+                return jsonify({'error': 'No data found'})
+            body, applied = series.compress(body, content_encoding)
+        else:
+            with phase('sql'):
+                if resolution == 'raw':
+                    data = conn.execute(PRICE_HISTORY_SQL, (card_name,)).fetchall()
+                else:
+                    data = conn.execute(ROLLUP_SQL, (card['id'], resolution, points)).fetchall()
+            body = (render_price_history(card_name, data) if resolution == 'raw'
+                    else render_rollup_history(card_name, resolution, data))
+            if body is None:
+                return jsonify({'error': 'No data found'})
+            applied = None
+        cached = (applied, body)
+        chart_cache.put(cache_key, card['data_version'], cached)
+    applied, body = cached
+    response = current_app.response_class(body, mimetype='application/json')
+    # Small bodies are left uncompressed, so the header follows what was stored
+    if applied:
+        response.headers['Content-Encoding'] = applied
+    response.vary.add('Accept-Encoding')
+    return response
+
+def price_rollups(card_name):
+    conn = get_db_connection()
+    card = conn.execute(CARD_VERSION_SQL, (card_name,)).fetchone()
+    if card is None:
+        return jsonify({'error': 'No data found'})
+    resolution, points = rollup_params(conn, card['id'])
+    if resolution is None:
+        return jsonify({'error': f"resolution must be auto or one of {', '.join(RESOLUTIONS)}"}), 400
+    with phase('sql'):
+        data = conn.execute(ROLLUP_SQL, (card['id'], resolution, points)).fetchall()
+    return jsonify({
+        'card_name': card_name,
+        'resolution': resolution,
+        'buckets': [dict(row) for row in data],
+    })
+
+def sales_history_no_outliers(card_name):
+    method = request.args.get('method', DEFAULT_METHOD)
+    if method not in METHODS:
+        return jsonify({'error': f"method must be one of {', '.join(METHODS)}"}), 400
+    conn = get_db_connection()
+    sql = MATCHED_SALES_NO_OUTLIERS_SQL if wants_matched() else SALES_NO_OUTLIERS_SQL
+    return sales_response(conn, sql, (method, f'%{card_name}%'))
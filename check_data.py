@@ -1,7 +1,7 @@
-import sqlite3
+import storage
 
 def check_database():
-    conn = sqlite3.connect('card_prices.db')
+    conn = storage.connect()
     cursor = conn.cursor()
     
     cursor.execute('SELECT COUNT(*) FROM card_prices')
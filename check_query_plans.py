@@ -0,0 +1,38 @@
+import sys
+import storage
+import charts
+from app import ROUTE_QUERIES
+
+# Names the sales table goes by in route SQL, including table aliases
+SALES_TABLE_NAMES = ('sales', 's')
+
+def plan_scans_sales(plan):
+    """True if any step of the plan walks sales row by row instead of seeking an index"""
+    return any(detail.split()[:2] in (['SCAN', name] for name in SALES_TABLE_NAMES) for detail in plan)
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN for every API route and fail if any of them scans sales"""
+    conn = storage.connect()
+    failures = []
+    
+    print("QUERY PLANS")
+    print("=" * 50)
+    for route, (query, params) in {**ROUTE_QUERIES, **charts.ROUTE_QUERIES}.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        status = 'SCAN' if plan_scans_sales(plan) else 'OK'
+        print(f"\n{route}: {status}")
+        for detail in plan:
+            print(f"   - {detail}")
+        if status != 'OK':
+            failures.append(route)
+    
+    conn.close()
+    print("=" * 50)
+    if failures:
+        print(f"Routes scanning sales: {', '.join(failures)}")
+        return False
+    print("No route scans sales")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
@@ -0,0 +1,159 @@
+"""Classify sold-listing titles against the card they were scraped for.
+
+A search for one card also returns lots, other grades and other parallels. Each
+title is normalized and scanned once with a single precompiled pattern that picks
+out its grade, card number, parallel and lot markers. It is then scored against
+rules derived from the card's name. The result is stored on the sale at ingest,
+so queries filter on `match_confidence` (see MATCH_THRESHOLD) instead of
+re-reading titles:
+
+    >>> classify(card_rules("victor wembanyama prizm #136 silver prizm psa 10 rc"),
+    ...          "2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC")
+    Classification(grade='psa 10', parallel='silver', is_lot=0, confidence=100)
+
+A contradiction (a lot, another grade, number or parallel) scores 0. Otherwise
+the confidence is the weighted share of the card's rules the title confirms.
+"""
+import difflib
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+# Sales scoring at least this are taken to be the card itself. The partial index
+# idx_sales_card_day_matched (migration v11) is built on this exact value
+MATCH_THRESHOLD = 80
+
+# How much each rule counts towards the confidence, when the card's name sets it
+WEIGHTS = {'tokens': 40, 'grade': 25, 'number': 20, 'parallel': 15}
+
+GRADERS = ('psa', 'bgs', 'sgc', 'cgc')
+
+# Longest first, so 'red white blue' wins over 'red' and 'cracked ice' over 'ice'
+PARALLELS = sorted([
+    'silver', 'gold', 'green', 'blue', 'red', 'orange', 'purple', 'pink', 'black', 'white',
+    'red white blue', 'white sparkle', 'neon green', 'cracked ice', 'fast break', 'mojo',
+    'wave', 'hyper', 'shimmer', 'disco', 'ice', 'camo', 'snakeskin', 'tiger', 'choice',
+    'scope', 'lazer', 'base',
+], key=len, reverse=True)
+PARALLEL_ALIASES = {'holo': 'silver', 'rwb': 'red white blue'}
+
+# Name words that say nothing about which card a title is
+STOPWORDS = {'rc', 'rookie', 'card', 'cards', 'the', 'and', 'of'}
+
+# Fuzzy matching only for name words this long, so short words must match exactly
+MIN_FUZZY_LENGTH = 5
+FUZZY_CUTOFF = 0.8
+
+_GRADE = re.compile(rf"\b({'|'.join(GRADERS)})\s*-?\s*(?:gem\s*(?:mint|mt)\s*|mint\s*)?(10|[1-9](?:\.5)?)\b")
+_NUMBER = re.compile(r'(?:#|\bno\.)\s*(\d+)\b')
+_PUNCTUATION = re.compile(r'[^a-z0-9#.\s]|(?<!\d)\.|\.(?!\d)')
+_SPACES = re.compile(r'\s+')
+
+# One pass over a normalized title finds every feature
+FEATURES = re.compile('|'.join([
+    rf"(?P<grade>\b(?:{'|'.join(GRADERS)}) (?:10|[1-9](?:\.5)?)\b)",
+    r'(?P<number>#\d+\b)',
+    r'(?P<lot>\blots?\b|\bbundle\b|\b(?:x\d+|\d+x)\b|\b\d+ cards\b|\bset of\b|\byou pick\b|\bpick your\b)',
+    rf"(?P<parallel>\b(?:{'|'.join(re.escape(p) for p in PARALLELS + sorted(PARALLEL_ALIASES))})\b)",
+]))
+
+# What a card's name requires of a title; None (or no parallels) where the name does not say
+CardRules = namedtuple('CardRules', ['grade', 'number', 'parallels', 'tokens'])
+
+Classification = namedtuple('Classification', ['grade', 'parallel', 'is_lot', 'confidence'])
+
+
+def normalize(text):
+    """Lowercase ASCII with grades as 'psa 10', numbers as '#136' and no other punctuation"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+    text = _GRADE.sub(r' \1 \2 ', text)
+    text = _NUMBER.sub(r' #\1 ', text)
+    return _SPACES.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+def features(title):
+    """(grades, numbers, parallels, is_lot) found in an already normalized title"""
+    grades, numbers, parallels, is_lot = set(), set(), set(), False
+    for match in FEATURES.finditer(title):
+        kind, value = match.lastgroup, match.group()
+        if kind == 'grade':
+            grades.add(value)
+        elif kind == 'number':
+            numbers.add(value)
+        elif kind == 'parallel':
+            parallels.add(PARALLEL_ALIASES.get(value, value))
+        else:
+            is_lot = True
+    return grades, numbers, parallels, is_lot
+
+
+@lru_cache(maxsize=1024)
+def card_rules(card_name):
+    """The rules a title must meet to be this card, read from the card's name"""
+    name = normalize(card_name.replace('_', ' '))
+    grades, numbers, parallels, _ = features(name)
+    # Whatever the features did not account for (player, set, year) must appear too
+    remainder = FEATURES.sub(' ', name).split()
+    tokens = tuple(dict.fromkeys(t for t in remainder if t not in STOPWORDS and len(t) > 1))
+    return CardRules(
+        grade=min(grades) if grades else None,
+        number=min(numbers) if numbers else None,
+        # Every parallel word in the name, since some are also player names ('jalen green')
+        parallels=frozenset(parallels),
+        tokens=tokens,
+    )
+
+
+def _token_share(tokens, title_words):
+    if not tokens:
+        return 1.0
+    found = 0
+    for token in tokens:
+        if token in title_words or (len(token) >= MIN_FUZZY_LENGTH and
+                                    difflib.get_close_matches(token, title_words, 1, FUZZY_CUTOFF)):
+            found += 1
+    return found / len(tokens)
+
+
+def classify(rules, title):
+    """Classification of one raw title against a card's rules"""
+    title = normalize(title)
+    grades, numbers, parallels, is_lot = features(title)
+    grade = min(grades) if grades else None
+    parallel = ' '.join(sorted(parallels - {'base'})) or None
+    required = rules.parallels - {'base'}
+    # A card named as 'base' rules out every other parallel; one named with none rules out nothing
+    contradicted = (
+        is_lot
+        or (rules.grade is not None and grades and rules.grade not in grades)
+        or (rules.number is not None and numbers and rules.number not in numbers)
+        or (rules.parallels and parallels - rules.parallels - {'base'})
+        or (required and 'base' in parallels and not required & parallels)
+    )
+    if contradicted:
+        return Classification(grade, parallel, int(is_lot), 0)
+
+    earned = WEIGHTS['tokens'] * _token_share(rules.tokens, FEATURES.sub(' ', title).split())
+    possible = WEIGHTS['tokens']
+    for rule, value, found in [('grade', rules.grade, grades), ('number', rules.number, numbers)]:
+        if value is not None:
+            possible += WEIGHTS[rule]
+            earned += WEIGHTS[rule] if value in found else 0
+    if required:
+        possible += WEIGHTS['parallel']
+        earned += WEIGHTS['parallel'] * len(required & parallels) / len(required)
+    return Classification(grade, parallel, 0, round(100 * earned / possible))
+
+
+def classify_titles(card_name, titles):
+    """Classify a batch of titles scraped for one card, scoring each distinct title once"""
+    rules = card_rules(card_name)
+    seen = {}
+    results = []
+    for title in titles:
+        result = seen.get(title)
+        if result is None:
+            result = seen[title] = classify(rules, title)
+        results.append(result)
+    return results
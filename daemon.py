@@ -0,0 +1,168 @@
+"""Resident scraper: keeps the watchlist fresh without paying startup cost per run.
+
+Cards sit in a priority queue keyed by when they are next due, seeded from each
+card's last scrape so a restart does not re-scrape everything. Whenever cards
+come due they are scraped together through the pipeline, stalest and most
+volatile first, reusing one warm HTTP session, parser process pool and SQLite
+connection for the life of the process. Edits to the watchlist file are picked
+up on the next wake-up.
+
+Usage: python daemon.py [--watchlist watchlist.toml] [--once] [--metrics-port 9108]
+"""
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+from logs import setup_logging
+from page_cache import PageCache
+from pipeline import ProcessParser, incremental_stop, run_pipeline
+from scheduler import DailyBudget, prioritize
+from scrape_engine import ScrapeEngine
+import storage
+from storage import load_checkpoints
+from watchlist import WATCHLIST_PATH, load_watchlist
+
+logger = logging.getLogger(__name__)
+
+# Longest the daemon sleeps before re-checking the watchlist file and the budget
+MAX_SLEEP_SECONDS = 300
+# Wait before retrying cards skipped because the daily budget ran out
+BUDGET_RETRY_SECONDS = 3600
+
+
+class ScrapeDaemon:
+    def __init__(self, watchlist_path=None, processes=None):
+        self.watchlist_path = watchlist_path or WATCHLIST_PATH
+        self.budget = DailyBudget()
+        self.engine = ScrapeEngine(budget=self.budget, cache=PageCache.from_env())
+        self.parse = ProcessParser(processes=processes)
+        # Shared by the scheduling code here and the pipeline's writer thread, never at once
+        self.conn = storage.connect(check_same_thread=False)
+        self.stop_event = threading.Event()
+        self.queue = []
+        self.entries = {}
+        self.watchlist_mtime = None
+        self.sequence = itertools.count()
+
+    def load(self):
+        """(Re)read the watchlist if it changed, scheduling new cards from their last scrape"""
+        try:
+            mtime = os.path.getmtime(self.watchlist_path)
+            if mtime == self.watchlist_mtime:
+                return
+            entries = {entry.query.card_name: entry for entry in load_watchlist(self.watchlist_path)}
+        except (OSError, ValueError) as e:
+            if self.watchlist_mtime is None:
+                raise
+            logger.error(f"Keeping the previous watchlist: {str(e)}")
+            return
+        self.watchlist_mtime = mtime
+        last_scraped = {
+            name: datetime.strptime(scraped_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+            for name, scraped_at in self.conn.execute(
+                "SELECT card_name, last_scraped_at FROM scrape_checkpoints WHERE last_scraped_at IS NOT NULL")
+        }
+        added = [name for name in entries if name not in self.entries]
+        self.entries = entries
+        for name in added:
+            scraped_at = last_scraped.get(name)
+            due = 0.0 if scraped_at is None else scraped_at + entries[name].refresh_hours * 3600
+            self.schedule(name, due)
+        logger.info(f"Watching {len(entries)} cards from {self.watchlist_path} ({len(added)} new)")
+
+    def schedule(self, card_name, due):
+        heapq.heappush(self.queue, (due, next(self.sequence), card_name))
+
+    def due_entries(self, now):
+        """Pop every card due by `now`; cards dropped from the watchlist fall out here"""
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            _, _, card_name = heapq.heappop(self.queue)
+            entry = self.entries.get(card_name)
+            if entry and entry not in due:
+                due.append(entry)
+        return due
+
+    def run_due(self, entries):
+        """Scrape a batch of due cards, grouped by page depth, then reschedule them"""
+        if self.engine.exhausted.is_set() and self.budget.remaining() > 0:
+            # A new day's budget; let the warm engine make requests again
+            self.engine.exhausted.clear()
+        queries = prioritize(self.conn, [entry.query for entry in entries])
+        by_name = {entry.query.card_name: entry for entry in entries}
+        checkpoints = load_checkpoints(self.conn, list(by_name))
+        for max_pages in sorted({entry.max_pages for entry in entries}, reverse=True):
+            batch = [query for query in queries if by_name[query.card_name].max_pages == max_pages]
+            pages, inserted, duplicates = run_pipeline(
+                self.engine, batch, {query.card_name: checkpoints[query.card_name] for query in batch},
+                max_pages=max_pages, should_continue=incremental_stop(checkpoints),
+                parse=self.parse, conn=self.conn)
+            logger.info(f"Scraped {len(batch)} cards: {pages} pages, {inserted} new, {duplicates} duplicates")
+        now = time.time()
+        for entry in entries:
+            delay = entry.refresh_hours * 3600
+            if self.engine.exhausted.is_set():
+                # Some of the batch may have been skipped; check back once the budget may have reset
+                delay = min(delay, BUDGET_RETRY_SECONDS)
+            self.schedule(entry.query.card_name, now + delay)
+
+    def run(self, once=False):
+        """Scrape cards as they come due until stopped; with `once`, only what is due now"""
+        self.load()
+        while not self.stop_event.is_set():
+            entries = self.due_entries(time.time())
+            if entries:
+                try:
+                    self.run_due(entries)
+                except Exception as e:
+                    logger.error(f"Scrape run failed, retrying later: {str(e)}")
+                    for entry in entries:
+                        self.schedule(entry.query.card_name, time.time() + BUDGET_RETRY_SECONDS)
+            if once:
+                break
+            next_due = self.queue[0][0] if self.queue else time.time() + MAX_SLEEP_SECONDS
+            self.stop_event.wait(min(MAX_SLEEP_SECONDS, max(0.0, next_due - time.time())))
+            self.load()
+
+    def stop(self, *args):
+        logger.info("Stopping scrape daemon")
+        self.stop_event.set()
+
+    def close(self):
+        self.engine.close()
+        self.parse.close()
+        self.budget.close()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--watchlist', default=None, help='watchlist file (default: $WATCHLIST_PATH or watchlist.toml)')
+    parser.add_argument('--once', action='store_true', help='scrape whatever is due now and exit, e.g. from cron')
+    parser.add_argument('--processes', type=int, default=None, help='parser worker processes')
+    parser.add_argument('--metrics-port', type=int, default=None, help='serve Prometheus metrics on this port')
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    daemon = ScrapeDaemon(args.watchlist, processes=args.processes)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run(once=args.once)
+    finally:
+        daemon.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
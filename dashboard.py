@@ -0,0 +1,129 @@
+"""Everything the dashboard shows for many cards at once, from one pass over each table.
+
+For the requested cards this reads `cards` once (for IDs and data versions), `sales`
+once (newest first, straight off the card/day index) and, when outliers are
+filtered, `outlier_bounds` once. Each card's chart series, latest sales and
+history are then cut from the same rows in Python, rather than re-queried per
+card and per widget.
+"""
+import bisect
+import hashlib
+import json
+
+import series
+from classifier import MATCH_THRESHOLD
+from units import from_cents, from_day
+
+# Cards per request; also keeps the IN lists well under SQLite's variable limit
+MAX_DASHBOARD_CARDS = 100
+DEFAULT_LATEST = 6
+DEFAULT_HISTORY = 500
+MAX_HISTORY = 5000
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+def dashboard_cards_sql(count):
+    return f'''
+    SELECT id, name, data_version
+    FROM cards
+    WHERE name IN ({_placeholders(range(count))})
+    '''
+
+
+def dashboard_sales_sql(count, matched=False):
+    # The literal threshold lets the planner use the partial index of matched sales
+    only_matched = f' AND match_confidence >= {MATCH_THRESHOLD}' if matched else ''
+    return f'''
+    SELECT card_id, sale_day, price_cents, listing_url
+    FROM sales
+    WHERE card_id IN ({_placeholders(range(count))}) AND sale_day IS NOT NULL{only_matched}
+    ORDER BY card_id, sale_day DESC, id
+    '''
+
+
+def dashboard_bounds_sql(count):
+    return f'''
+    SELECT card_id, period_start, period_end, lower, upper
+    FROM outlier_bounds
+    WHERE method = ? AND card_id IN ({_placeholders(range(count))})
+    ORDER BY card_id, period_start
+    '''
+
+
+def load_cards(conn, names):
+    """{name: (card_id, data_version)} for the names that exist"""
+    rows = conn.execute(dashboard_cards_sql(len(names)), names).fetchall()
+    return {name: (card_id, version) for card_id, name, version in rows}
+
+
+def etag(cards, options):
+    """Validator for a dashboard response: changes when any card's data or the options change"""
+    versions = sorted((name, version) for name, (_, version) in cards.items())
+    return hashlib.sha1(json.dumps([versions, options], sort_keys=True).encode()).hexdigest()
+
+
+def _bounds_by_card(conn, card_ids, method):
+    bounds = {}
+    for card_id, start, end, lower, upper in conn.execute(
+            dashboard_bounds_sql(len(card_ids)), [method] + card_ids):
+        bounds.setdefault(card_id, ([], []))
+        bounds[card_id][0].append(start)
+        bounds[card_id][1].append((end, lower * 100, upper * 100))
+    return bounds
+
+
+def _within_bounds(bounds, sale_day, price_cents):
+    """Same test as the no-outliers SQL: the sale's period exists and its price is inside it"""
+    if bounds is None:
+        return False
+    starts, periods = bounds
+    i = bisect.bisect_right(starts, sale_day) - 1
+    if i < 0:
+        return False
+    end, lower, upper = periods[i]
+    return sale_day <= end and lower <= price_cents <= upper
+
+
+def load_dashboard(conn, cards, latest=DEFAULT_LATEST, history=DEFAULT_HISTORY, method=None,
+                   encoding='plain', matched=False):
+    """Series, latest sales and history for each card in `cards` (from load_cards).
+
+    Each series is oldest-first day and cent columns in the series.py format. With
+    `method`, history leaves out sales outside that method's outlier bounds; the
+    chart series and latest sales always include every sale. With `matched`, all three
+    only include sales whose titles matched their card.
+    """
+    names = {card_id: name for name, (card_id, _) in cards.items()}
+    result = {name: {'series': {'days': [], 'cents': []}, 'latest': [], 'history': []}
+              for name in cards}
+    if not names:
+        return result
+    card_ids = list(names)
+    bounds = _bounds_by_card(conn, card_ids, method) if method else None
+    for card_id, sale_day, price_cents, listing_url in conn.execute(
+            dashboard_sales_sql(len(card_ids), matched), card_ids):
+        entry = result[names[card_id]]
+        sale_date = from_day(sale_day).isoformat()
+        price = from_cents(price_cents)
+        entry['series']['days'].append(sale_day)
+        entry['series']['cents'].append(price_cents)
+        if len(entry['latest']) < latest or len(entry['history']) < history:
+            sale = {'card_name': names[card_id], 'price': price, 'sale_date': sale_date,
+                    'listing_url': listing_url}
+            if len(entry['latest']) < latest:
+                entry['latest'].append(sale)
+            if len(entry['history']) < history and (
+                    bounds is None or _within_bounds(bounds.get(card_id), sale_day, price_cents)):
+                entry['history'].append(sale)
+    for entry in result.values():
+        # Rows arrive newest-first; series run oldest-first like series.raw_columns
+        columns = {name: values[::-1] for name, values in entry['series'].items()}
+        entry['series'] = encode_series(columns, encoding)
+    return result
+
+
+def encode_series(columns, encoding):
+    return {'encoding': encoding, 'columns': series.encode_columns(columns, encoding)}
@@ -0,0 +1,101 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from listing_ids import normalize_listing_id
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('CARD_PRICES_DB', 'card_prices.db')
+
+# WAL lets API readers keep going while a scraper writes; NORMAL sync is safe under WAL
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -32000),      # KiB, i.e. ~32 MB of page cache per connection
+    ('mmap_size', 268435456),    # 256 MB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+# Prepared statements kept per connection; the API only has a handful of distinct queries
+STATEMENT_CACHE_SIZE = 256
+
+
+def connect(path=None, row_factory=None, check_same_thread=True):
+    """Open a connection with the project's pragmas applied"""
+    conn = sqlite3.connect(path or DB_PATH, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    # The card_prices view's insert trigger keys rows the same way SalesWriter does
+    conn.create_function('normalize_listing_id', 1, normalize_listing_id, deterministic=True)
+    if row_factory:
+        conn.row_factory = row_factory
+    return conn
+
+
+class ConnectionPool:
+    """Hands every thread its own long-lived connection, reused across requests"""
+
+    def __init__(self, path=None, row_factory=sqlite3.Row):
+        self.path = path
+        self.row_factory = row_factory
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.opened = 0
+        self.closed = 0
+        self.checkouts = 0
+        # Called with each newly opened connection, e.g. to run schema migrations
+        self.on_open = None
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Other threads never use it, but the pool may need to close it from elsewhere
+            conn = connect(self.path, self.row_factory, check_same_thread=False)
+            if self.on_open:
+                self.on_open(conn)
+            self.local.conn = conn
+            with self.lock:
+                self._reap()
+                self.connections[threading.get_ident()] = conn
+                self.opened += 1
+            logger.info(f"Opened pooled connection for thread {threading.get_ident()}")
+        with self.lock:
+            self.checkouts += 1
+        return conn
+
+    def _reap(self):
+        """Close connections whose owning thread has exited; caller holds the lock"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self.connections if ident not in alive]:
+            self.connections.pop(ident).close()
+            self.closed += 1
+
+    def stats(self):
+        with self.lock:
+            self._reap()
+            return {
+                'path': self.path or DB_PATH,
+                'open_connections': len(self.connections),
+                'opened': self.opened,
+                'closed': self.closed,
+                'checkouts': self.checkouts,
+                'reused': self.checkouts - self.opened,
+                'statement_cache_size': STATEMENT_CACHE_SIZE,
+            }
+
+    def close_all(self):
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.closed += len(self.connections)
+            self.connections.clear()
+        self.local = threading.local()
+
+
+pool = ConnectionPool()
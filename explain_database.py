@@ -1,8 +1,8 @@
-import sqlite3
+import storage
 
 def explain_database():
     """Explain the database structure and show what's in it"""
-    conn = sqlite3.connect('card_prices.db')
+    conn = storage.connect()
     cursor = conn.cursor()
     
     print("DATABASE STRUCTURE EXPLANATION")
@@ -24,15 +24,15 @@ def explain_database():
     
     # Show table structure
     print(f"\n3. TABLE STRUCTURE:")
-    cursor.execute("PRAGMA table_info(card_prices)")
+    cursor.execute("PRAGMA table_info(sales)")
     columns = cursor.fetchall()
-    print("   card_prices table columns:")
+    print("   sales table columns:")
     for col in columns:
         print(f"     - {col[1]} ({col[2]}) - Primary Key: {col[5]}, Not Null: {col[3]}")
     
     # Show index details
     print(f"\n4. INDEX DETAILS:")
-    cursor.execute("PRAGMA index_list(card_prices)")
+    cursor.execute("PRAGMA index_list(sales)")
     index_list = cursor.fetchall()
     for idx in index_list:
         index_name = idx[1]
@@ -42,7 +42,7 @@ def explain_database():
     
     # Show sample data
     print(f"\n5. SAMPLE DATA:")
-    cursor.execute("SELECT COUNT(*) FROM card_prices")
+    cursor.execute("SELECT COUNT(*) FROM sales")
     count = cursor.fetchone()[0]
     print(f"   Total records: {count}")
     
@@ -0,0 +1,195 @@
+"""Per-card fair-value model: an exponentially weighted, outlier-robust price estimate.
+
+Each card keeps a small state row in `fair_value_models`, updated in O(1) as every
+new sale is stored:
+
+- `level` is the weighted mean of log prices. Weights halve every HALF_LIFE_DAYS
+  of sale date, so the fair value follows the market and forgets stale sales.
+- `scale` is the weighted mean absolute deviation around it (the volatility).
+- Each sale's pull on both is clipped to CLIP_SCALES scales, so one lot or
+  mislabeled grade cannot drag the estimate far.
+
+The fair value is exp(level), with bands at BAND_SIGMAS standard deviations either
+side. Only sales whose titles matched their card (see classifier.py) are used.
+Sales are applied in date order. The scraper stores a card's history newest-first,
+so when a batch brings sales older than the newest one applied, the card's model
+is refolded from all its sales in date order. Stored models therefore match what
+`rebuild` computes, whatever order the sales arrived in.
+
+Usage: python fair_value.py rebuild
+"""
+import argparse
+import logging
+import math
+import sys
+import time
+
+from classifier import MATCH_THRESHOLD
+from units import from_day
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE_DAYS = 30
+# Residuals are clipped at this many scales before they move the model
+CLIP_SCALES = 2.5
+# Scale given to a card's first sale, and the floor for clipping, in log price
+INITIAL_SCALE = 0.15
+MIN_SCALE = 0.02
+# A normal distribution's standard deviation is this many mean absolute deviations
+SIGMA_PER_MAD = math.sqrt(math.pi / 2)
+BAND_SIGMAS = 2
+
+# Sales newer than a rowid, in the order the model applies them
+NEW_SALES_SQL = f'''
+    SELECT sale_day, price_cents
+    FROM sales
+    WHERE id > ? AND +card_id = ? AND sale_day IS NOT NULL AND match_confidence >= {MATCH_THRESHOLD}
+    ORDER BY sale_day, id
+'''
+
+# One card's modelled sales, for refolding its model after older sales arrive
+CARD_SALES_SQL = f'''
+    SELECT sale_day, price_cents
+    FROM sales
+    WHERE card_id = ? AND sale_day IS NOT NULL AND match_confidence >= {MATCH_THRESHOLD}
+    ORDER BY sale_day, id
+'''
+
+# Every card's modelled sales in one pass, read off the partial index of matched sales
+ALL_SALES_SQL = f'''
+    SELECT card_id, sale_day, price_cents
+    FROM sales
+    WHERE sale_day IS NOT NULL AND match_confidence >= {MATCH_THRESHOLD}
+    ORDER BY card_id, sale_day, id
+'''
+
+MODEL_SQL = '''
+    SELECT level, scale, weight, sale_count, last_day
+    FROM fair_value_models
+    WHERE card_id = ?
+'''
+
+UPSERT_SQL = '''
+    INSERT INTO fair_value_models (card_id, level, scale, weight, sale_count, last_day, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(card_id) DO UPDATE SET
+        level = excluded.level,
+        scale = excluded.scale,
+        weight = excluded.weight,
+        sale_count = excluded.sale_count,
+        last_day = excluded.last_day,
+        updated_at = excluded.updated_at
+'''
+
+
+def update(model, sale_day, price_cents):
+    """Apply one sale, no older than the model's last, to a (level, scale, weight, sale_count,
+    last_day) model; None starts a new one"""
+    x = math.log(price_cents / 100)
+    if model is None:
+        return x, INITIAL_SCALE, 1.0, 1, sale_day
+    level, scale, weight, count, last_day = model
+    weight = weight * 2 ** (-(sale_day - last_day) / HALF_LIFE_DAYS) + 1
+    limit = CLIP_SCALES * max(scale, MIN_SCALE)
+    residual = min(max(x - level, -limit), limit)
+    level += residual / weight
+    scale += (abs(residual) - scale) / weight
+    return level, scale, weight, count + 1, sale_day
+
+
+def apply_new_sales(conn, card_id, after_id):
+    """Fold a card's sales stored after rowid `after_id` into its model; call inside the insert's transaction"""
+    rows = conn.execute(NEW_SALES_SQL, (after_id, card_id)).fetchall()
+    if not rows:
+        return
+    model = conn.execute(MODEL_SQL, (card_id,)).fetchone()
+    model = tuple(model) if model else None
+    # Rows come oldest first; one older than the model's newest sale means a backfill
+    if model is not None and rows[0][0] < model[4]:
+        rows = conn.execute(CARD_SALES_SQL, (card_id,)).fetchall()
+        model = None
+    for sale_day, price_cents in rows:
+        model = update(model, sale_day, price_cents)
+    conn.execute(UPSERT_SQL, (card_id, *model, int(time.time())))
+
+
+def rebuild(conn):
+    """Recompute every card's model from sales in one pass.
+
+    The recursion is sequential within a card, so cards are advanced in lockstep: step
+    k applies the k-th sale of every card that has one as a single set of array
+    operations. The loop runs as many times as the longest history has sales,
+    not once per row.
+    """
+    import numpy as np
+
+    rows = conn.execute(ALL_SALES_SQL).fetchall()
+    conn.execute("DELETE FROM fair_value_models")
+    if not rows:
+        return 0
+    data = np.array(rows, dtype=np.int64)
+    card_ids, days = data[:, 0], data[:, 1]
+    prices = np.log(data[:, 2] / 100)
+    starts = np.flatnonzero(np.r_[True, card_ids[1:] != card_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    group = np.repeat(np.arange(len(starts)), counts)
+    position = np.arange(len(rows)) - starts[group]
+    # Row indices grouped by position, so step k is one contiguous slice
+    by_position = np.argsort(position, kind='stable')
+    step_ends = np.cumsum(np.bincount(position))
+
+    level = prices[starts].copy()
+    scale = np.full(len(starts), INITIAL_SCALE)
+    weight = np.ones(len(starts))
+    last_day = days[starts].astype(np.float64)
+    for k in range(1, len(step_ends)):
+        rows_k = by_position[step_ends[k - 1]:step_ends[k]]
+        g = group[rows_k]
+        weight[g] = weight[g] * 2.0 ** (-(days[rows_k] - last_day[g]) / HALF_LIFE_DAYS) + 1
+        limit = CLIP_SCALES * np.maximum(scale[g], MIN_SCALE)
+        residual = np.clip(prices[rows_k] - level[g], -limit, limit)
+        level[g] += residual / weight[g]
+        scale[g] += (np.abs(residual) - scale[g]) / weight[g]
+        last_day[g] = days[rows_k]
+
+    now = int(time.time())
+    conn.executemany(UPSERT_SQL, zip(
+        card_ids[starts].tolist(), level.tolist(), scale.tolist(), weight.tolist(),
+        counts.tolist(), last_day.astype(np.int64).tolist(), [now] * len(starts)))
+    logger.info(f"Rebuilt fair-value models for {len(starts)} cards from {len(rows)} sales")
+    return len(starts)
+
+
+def describe(level, scale, weight, sale_count, last_day):
+    """A stored model as the API returns it, in dollars"""
+    sigma = SIGMA_PER_MAD * scale
+    return {
+        'fair_value': round(math.exp(level), 2),
+        'low': round(math.exp(level - BAND_SIGMAS * sigma), 2),
+        'high': round(math.exp(level + BAND_SIGMAS * sigma), 2),
+        'volatility': round(sigma, 4),
+        'effective_sales': round(weight, 2),
+        'sale_count': sale_count,
+        'last_sale_date': from_day(last_day).isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args()
+
+    # storage imports this module for the ingest path, so import it only when run as a script
+    import storage
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    conn = storage.connect()
+    started = time.perf_counter()
+    with conn:
+        cards = rebuild(conn)
+    conn.close()
+    print(f"Rebuilt {cards} fair-value models in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
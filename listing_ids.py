@@ -0,0 +1,23 @@
+"""Stable IDs for eBay listings, shared by the scraper, storage and the database.
+
+Kept apart from parsers.py, and to the stdlib, so that db.py can register
+normalize_listing_id() on every connection without the API importing a parser.
+"""
+import re
+from urllib.parse import parse_qs, urlsplit
+
+ITEM_ID_RE = re.compile(r'/itm/(?:[^/?#]+/)?(\d{9,})')
+
+
+def normalize_listing_id(listing_url):
+    """Reduce an eBay listing URL to a stable ID so tracking params don't defeat dedup"""
+    if not listing_url:
+        return None
+    match = ITEM_ID_RE.search(listing_url)
+    if match:
+        return match.group(1)
+    parts = urlsplit(listing_url)
+    item = parse_qs(parts.query).get('item')
+    if item:
+        return item[0]
+    return f"{parts.netloc}{parts.path}".lower().rstrip('/')
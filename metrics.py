@@ -0,0 +1,184 @@
+"""In-process counters and timers, exported in the Prometheus text format.
+
+Hot paths record into the module-level registry with almost no overhead (one lock
+and a few additions per observation):
+
+    with metrics.timer('scrape_parse_seconds'):
+        items = parse(html)
+    metrics.inc('sales_inserted_total', inserted)
+
+The API serves the registry at /metrics; the scrape daemon can serve it on its own
+port with serve(). Each process has its own registry, so scrape a metrics endpoint
+per process.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket upper bounds in seconds, from a cached chart to a slow eBay page
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'scrape_requests_total': 'Requests sent to eBay, by outcome',
+    'scrape_pages_total': 'Result pages handed to the parser, by source',
+    'scrape_fetch_seconds': 'Time waiting on one eBay request, including the host slot',
+    'scrape_parse_seconds': 'Time from handing a result page to the parser to getting its items back',
+    'sales_insert_seconds': 'Time to write one batch of sales, rollups and fair values included',
+    'outlier_refresh_seconds': "Time to recompute the outlier bounds of a writer's changed cards",
+    'sales_inserted_total': 'New sales written',
+    'sales_duplicates_total': 'Scraped sales that were already stored',
+    'api_requests_total': 'API requests, by route and status',
+    'api_request_seconds': 'Time for a route to build its response',
+    'api_phase_seconds': 'Time spent in one phase (sql, serialize, pandas, plotly) of a route',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, as Prometheus histograms need"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe store of counters and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        # Callables yielding (name, labels, value) gauges, read at render time
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe how long the block takes, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collect):
+        """Register a callable that yields current gauge values as (name, labels_dict, value)"""
+        self.collectors.append(collect)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Counter values and histogram (count, sum) by (name, label_key), for tests and logs"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (h.count, h.sum) for key, h in self.histograms.items()}
+        return counters, histograms
+
+    def render(self):
+        """The whole registry in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in self.histograms.items())
+        gauges = {}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                gauges[(name, _label_key(labels))] = value
+
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, key), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        for (name, key), (counts, total, count, buckets) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{name}_count{_format_labels(key)} {count}')
+        for (name, key), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+render = REGISTRY.render
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0'):
+    """Serve the registry on http://host:port/ from a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,464 @@
+"""Versioned schema migrations for card_prices.db.
+
+The schema version lives in PRAGMA user_version. Each migration is a function
+that takes a cursor and runs inside the same transaction as the version bump,
+so a crash part-way through leaves the database on the previous version.
+Append new migrations to MIGRATIONS; never edit or reorder the existing ones.
+"""
+import logging
+
+import classifier
+import fair_value
+import rollups
+from listing_ids import normalize_listing_id
+from units import DATE_TO_DAY_SQL, DAY_TO_DATE_SQL
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def add_listing_ids(cursor, table):
+    """Create a sales table if needed and give it a backfilled, UNIQUE listing_id"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_name TEXT NOT NULL,
+            title TEXT NOT NULL,
+            price REAL NOT NULL,
+            sale_date TEXT,
+            listing_url TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            listing_id TEXT
+        )
+    ''')
+    if 'listing_id' not in _columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN listing_id TEXT")
+
+    # Backfill IDs for rows written before dedup existed, then drop the repeats
+    cursor.execute(f"SELECT id, listing_url FROM {table} WHERE listing_id IS NULL")
+    backfill = [(normalize_listing_id(url), row_id) for row_id, url in cursor.fetchall()]
+    if backfill:
+        cursor.executemany(f"UPDATE {table} SET listing_id = ? WHERE id = ?", backfill)
+        cursor.execute(f'''
+            DELETE FROM {table}
+            WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY listing_id)
+        ''')
+        logger.info(f"Backfilled listing IDs for {len(backfill)} rows in {table}, "
+                    f"removed {cursor.rowcount} duplicates")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_listing_id ON {table}(listing_id)")
+
+
+def _v1_listing_ids(cursor):
+    add_listing_ids(cursor, 'card_prices')
+
+
+def _v2_cards_table(cursor):
+    """Move card names into `cards` and point every sale at its card by integer ID"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cards (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    if 'card_id' not in _columns(cursor, 'card_prices'):
+        cursor.execute("ALTER TABLE card_prices ADD COLUMN card_id INTEGER REFERENCES cards(id)")
+    cursor.execute("INSERT OR IGNORE INTO cards (name) SELECT DISTINCT card_name FROM card_prices")
+    cursor.execute('''
+        UPDATE card_prices
+        SET card_id = (SELECT id FROM cards WHERE cards.name = card_prices.card_name)
+        WHERE card_id IS NULL
+    ''')
+    # The scraper sets card_id itself; this catches rows inserted by other tools
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS card_prices_assign_card
+        AFTER INSERT ON card_prices WHEN NEW.card_id IS NULL
+        BEGIN
+            INSERT OR IGNORE INTO cards (name) VALUES (NEW.card_name);
+            UPDATE card_prices SET card_id = (SELECT id FROM cards WHERE name = NEW.card_name)
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _v3_card_date_index(cursor):
+    """Serve `WHERE card = ? ORDER BY sale_date DESC` straight from an index, no sort"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_card_prices_card_sale_date
+        ON card_prices(card_id, sale_date DESC)
+    ''')
+
+
+def _v4_card_search(cursor):
+    """Trigram FTS5 index over card names so substring search needs no table scan"""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts
+        USING fts5(name, content='cards', content_rowid='id', tokenize='trigram')
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+            INSERT INTO cards_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+            INSERT INTO cards_fts (cards_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE ON cards BEGIN
+            INSERT INTO cards_fts (cards_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO cards_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    ''')
+    cursor.execute("INSERT INTO cards_fts (cards_fts) VALUES ('rebuild')")
+
+
+def _v5_card_data_version(cursor):
+    """Per-card counter bumped whenever a card gains sales, for cache invalidation"""
+    if 'data_version' not in _columns(cursor, 'cards'):
+        cursor.execute("ALTER TABLE cards ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+    # Version bumps must not churn the name index, so only re-index when the name changes
+    cursor.execute("DROP TRIGGER IF EXISTS cards_fts_update")
+    cursor.execute('''
+        CREATE TRIGGER cards_fts_update AFTER UPDATE OF name ON cards BEGIN
+            INSERT INTO cards_fts (cards_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO cards_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    ''')
+
+
+def _v6_price_rollups(cursor):
+    """Per-card day/week/month price summaries, backfilled from existing sales"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            card_id INTEGER NOT NULL REFERENCES cards(id),
+            resolution TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            sale_count INTEGER NOT NULL,
+            min_price REAL NOT NULL,
+            max_price REAL NOT NULL,
+            mean_price REAL NOT NULL,
+            median_price REAL NOT NULL,
+            trimmed_mean_price REAL NOT NULL,
+            PRIMARY KEY (card_id, resolution, bucket_start)
+        ) WITHOUT ROWID
+    ''')
+    rollups.rebuild(cursor)
+
+
+def _v7_outlier_bounds(cursor):
+    """Stored per-card outlier bounds so filtering is a range predicate, backfilled now"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outlier_bounds (
+            card_id INTEGER NOT NULL REFERENCES cards(id),
+            method TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            lower REAL NOT NULL,
+            upper REAL NOT NULL,
+            PRIMARY KEY (card_id, method, period_start)
+        ) WITHOUT ROWID
+    ''')
+    # Imported here so opening an up-to-date database never loads numpy
+    import outliers
+    outliers.rebuild(cursor)
+
+
+def _v8_active_listings(cursor):
+    """Currently listed (unsold) items, scored against sold comps for undervalued deals"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS active_listings (
+            listing_id TEXT PRIMARY KEY,
+            card_id INTEGER NOT NULL REFERENCES cards(id),
+            title TEXT NOT NULL,
+            price REAL NOT NULL,
+            listing_url TEXT NOT NULL,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_listings_last_seen ON active_listings(last_seen)")
+
+
+def _v9_scrape_budget(cursor):
+    """Calls made to eBay per UTC day, shared by every scraper process"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_budget (
+            day TEXT PRIMARY KEY,
+            calls INTEGER NOT NULL
+        )
+    ''')
+
+
+def _v10_compact_sales(cursor):
+    """Move every sale into one compact `sales` table and leave card_prices as a view over it.
+
+    Prices become integer cents, sale dates integer days since the epoch, and the card
+    name is replaced by its ID. Rows from the old per-card multiple_pages_wemby table
+    are merged in (deduplicated on listing_id) and that table is dropped. The view keeps
+    the old column names for ad-hoc queries, and inserts into it land in `sales`.
+    """
+    cursor.execute('''
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL REFERENCES cards(id),
+            sale_day INTEGER,
+            price_cents INTEGER NOT NULL,
+            scraped_at INTEGER NOT NULL,
+            listing_id TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            listing_url TEXT NOT NULL
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT INTO sales (id, card_id, sale_day, price_cents, scraped_at, listing_id, title, listing_url)
+        SELECT id, card_id, {DATE_TO_DAY_SQL.format('sale_date')}, CAST(round(price * 100) AS INTEGER),
+               COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0), listing_id, title, listing_url
+        FROM card_prices
+        WHERE listing_id IS NOT NULL AND card_id IS NOT NULL
+    ''')
+    logger.info(f"Copied {cursor.rowcount} rows from card_prices into sales")
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'multiple_pages_wemby'")
+    if cursor.fetchone():
+        add_listing_ids(cursor, 'multiple_pages_wemby')
+        cursor.execute("INSERT OR IGNORE INTO cards (name) SELECT DISTINCT card_name FROM multiple_pages_wemby")
+        cursor.execute(f'''
+            INSERT INTO sales (card_id, sale_day, price_cents, scraped_at, listing_id, title, listing_url)
+            SELECT c.id, {DATE_TO_DAY_SQL.format('m.sale_date')}, CAST(round(m.price * 100) AS INTEGER),
+                   COALESCE(CAST(strftime('%s', m.timestamp) AS INTEGER), 0), m.listing_id, m.title, m.listing_url
+            FROM multiple_pages_wemby m
+            JOIN cards c ON c.name = m.card_name
+            WHERE m.listing_id IS NOT NULL
+            ORDER BY m.id
+            ON CONFLICT(listing_id) DO NOTHING
+        ''')
+        logger.info(f"Merged {cursor.rowcount} rows from multiple_pages_wemby into sales")
+        cursor.execute("DROP TABLE multiple_pages_wemby")
+
+    cursor.execute("DROP TABLE card_prices")
+    cursor.execute('''
+        CREATE INDEX idx_sales_card_day ON sales(card_id, sale_day DESC)
+    ''')
+    cursor.execute(f'''
+        CREATE VIEW card_prices AS
+        SELECT s.id, c.name AS card_name, s.title, s.price_cents / 100.0 AS price,
+               {DAY_TO_DATE_SQL.format('s.sale_day')} AS sale_date, s.listing_url,
+               datetime(s.scraped_at, 'unixepoch') AS timestamp, s.listing_id, s.card_id
+        FROM sales s
+        JOIN cards c ON c.id = s.card_id
+    ''')
+    # Keeps other tools that insert rows the old way working; the scraper writes to sales directly
+    cursor.execute(f'''
+        CREATE TRIGGER card_prices_insert INSTEAD OF INSERT ON card_prices
+        BEGIN
+            INSERT OR IGNORE INTO cards (name) VALUES (NEW.card_name);
+            INSERT OR IGNORE INTO sales (card_id, sale_day, price_cents, scraped_at, listing_id, title, listing_url)
+            VALUES (
+                (SELECT id FROM cards WHERE name = NEW.card_name),
+                {DATE_TO_DAY_SQL.format('NEW.sale_date')},
+                CAST(round(NEW.price * 100) AS INTEGER),
+                COALESCE(CAST(strftime('%s', NEW.timestamp) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER)),
+                COALESCE(NEW.listing_id, NEW.listing_url),
+                NEW.title,
+                NEW.listing_url
+            );
+            UPDATE cards SET data_version = data_version + 1 WHERE name = NEW.card_name;
+        END
+    ''')
+
+    # Outlier periods become epoch days to match sale_day
+    cursor.execute("DROP TABLE outlier_bounds")
+    cursor.execute('''
+        CREATE TABLE outlier_bounds (
+            card_id INTEGER NOT NULL REFERENCES cards(id),
+            method TEXT NOT NULL,
+            period_start INTEGER NOT NULL,
+            period_end INTEGER NOT NULL,
+            lower REAL NOT NULL,
+            upper REAL NOT NULL,
+            PRIMARY KEY (card_id, method, period_start)
+        ) WITHOUT ROWID
+    ''')
+    # Imported here so opening an up-to-date database never loads numpy
+    import outliers
+    rollups.rebuild(cursor)
+    outliers.rebuild(cursor)
+    cursor.execute("UPDATE cards SET data_version = data_version + 1")
+
+
+def _v11_listing_classification(cursor):
+    """Tag every sale with its title's grade, parallel, lot flag and match confidence (see classifier.py).
+
+    The partial index holds only the sales that confidently match their card, so routes
+    asking for those walk it instead of checking each row's confidence.
+    """
+    for column, definition in [
+        ('grade', 'TEXT'),
+        ('parallel', 'TEXT'),
+        ('is_lot', 'INTEGER NOT NULL DEFAULT 0'),
+        ('match_confidence', 'INTEGER NOT NULL DEFAULT 0'),
+    ]:
+        cursor.execute(f"ALTER TABLE sales ADD COLUMN {column} {definition}")
+    cursor.execute("SELECT s.id, c.name, s.title FROM sales s JOIN cards c ON c.id = s.card_id")
+    by_card = {}
+    for row_id, card_name, title in cursor.fetchall():
+        by_card.setdefault(card_name, []).append((row_id, title))
+    for card_name, rows in by_card.items():
+        results = classifier.classify_titles(card_name, [title for _, title in rows])
+        cursor.executemany(
+            "UPDATE sales SET grade = ?, parallel = ?, is_lot = ?, match_confidence = ? WHERE id = ?",
+            [(*result, row_id) for (row_id, _), result in zip(rows, results)])
+    logger.info(f"Classified {sum(len(rows) for rows in by_card.values())} sale titles")
+    # Fixed at classifier.MATCH_THRESHOLD; queries must repeat the literal for the planner to use it
+    cursor.execute('''
+        CREATE INDEX idx_sales_card_day_matched ON sales(card_id, sale_day DESC)
+        WHERE match_confidence >= 80
+    ''')
+    cursor.execute("UPDATE cards SET data_version = data_version + 1")
+
+
+def _v12_fair_value_models(cursor):
+    """Per-card fair-value model state, updated as sales are stored (see fair_value.py)"""
+    cursor.execute('''
+        CREATE TABLE fair_value_models (
+            card_id INTEGER PRIMARY KEY REFERENCES cards(id),
+            level REAL NOT NULL,
+            scale REAL NOT NULL,
+            weight REAL NOT NULL,
+            sale_count INTEGER NOT NULL,
+            last_day INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    fair_value.rebuild(cursor)
+
+
+def _v13_view_listing_ids(cursor):
+    """Normalize listing IDs of rows inserted through the card_prices view.
+
+    The v10 trigger stored the full listing URL as the listing ID, so the same sale
+    scraped later was not caught as a duplicate. The trigger now reduces the URL with
+    normalize_listing_id(), which db.connect() registers on every connection. Rows
+    already stored that way are rekeyed, and ones the scraper has since stored under
+    the normalized ID are dropped.
+    """
+    cursor.execute("DROP TRIGGER card_prices_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER card_prices_insert INSTEAD OF INSERT ON card_prices
+        BEGIN
+            INSERT OR IGNORE INTO cards (name) VALUES (NEW.card_name);
+            INSERT OR IGNORE INTO sales (card_id, sale_day, price_cents, scraped_at, listing_id, title, listing_url)
+            VALUES (
+                (SELECT id FROM cards WHERE name = NEW.card_name),
+                {DATE_TO_DAY_SQL.format('NEW.sale_date')},
+                CAST(round(NEW.price * 100) AS INTEGER),
+                COALESCE(CAST(strftime('%s', NEW.timestamp) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER)),
+                normalize_listing_id(COALESCE(NEW.listing_id, NEW.listing_url)),
+                NEW.title,
+                NEW.listing_url
+            );
+            UPDATE cards SET data_version = data_version + 1 WHERE name = NEW.card_name;
+        END
+    ''')
+
+    cursor.execute("SELECT id, card_id, listing_id FROM sales WHERE listing_id = listing_url")
+    rows = [(row_id, card_id, normalize_listing_id(listing_id)) for row_id, card_id, listing_id in cursor.fetchall()]
+    rekey, repeats, claimed = [], [], set()
+    for row_id, card_id, listing_id in rows:
+        cursor.execute("SELECT 1 FROM sales WHERE listing_id = ?", (listing_id,))
+        if cursor.fetchone() or listing_id in claimed:
+            repeats.append((row_id, card_id))
+        else:
+            rekey.append((row_id, listing_id))
+            claimed.add(listing_id)
+    cursor.executemany("UPDATE sales SET listing_id = ? WHERE id = ?", [(new_id, row_id) for row_id, new_id in rekey])
+    if not repeats:
+        return
+    cursor.executemany("DELETE FROM sales WHERE id = ?", [(row_id,) for row_id, _ in repeats])
+    logger.info(f"Rekeyed {len(rekey)} sales and removed {len(repeats)} duplicates stored through card_prices")
+    # Derived tables still count the removed rows
+    import outliers
+    card_ids = sorted({card_id for _, card_id in repeats})
+    rollups.rebuild(cursor, card_ids)
+    for card_id in card_ids:
+        outliers.refresh_bounds(cursor, card_id)
+    fair_value.rebuild(cursor)
+    cursor.executemany("UPDATE cards SET data_version = data_version + 1 WHERE id = ?",
+                       [(card_id,) for card_id in card_ids])
+
+
+def _v14_active_listing_classification(cursor):
+    """Tag active listings like sales, so only listings that are the card itself get scored"""
+    for column, definition in [
+        ('grade', 'TEXT'),
+        ('parallel', 'TEXT'),
+        ('is_lot', 'INTEGER NOT NULL DEFAULT 0'),
+        ('match_confidence', 'INTEGER NOT NULL DEFAULT 0'),
+    ]:
+        cursor.execute(f"ALTER TABLE active_listings ADD COLUMN {column} {definition}")
+    cursor.execute("SELECT a.listing_id, c.name, a.title FROM active_listings a JOIN cards c ON c.id = a.card_id")
+    by_card = {}
+    for listing_id, card_name, title in cursor.fetchall():
+        by_card.setdefault(card_name, []).append((listing_id, title))
+    for card_name, rows in by_card.items():
+        results = classifier.classify_titles(card_name, [title for _, title in rows])
+        cursor.executemany(
+            "UPDATE active_listings SET grade = ?, parallel = ?, is_lot = ?, match_confidence = ? WHERE listing_id = ?",
+            [(*result, listing_id) for (listing_id, _), result in zip(rows, results)])
+    logger.info(f"Classified {sum(len(rows) for rows in by_card.values())} active listing titles")
+
+
+MIGRATIONS = [
+    _v1_listing_ids,
+    _v2_cards_table,
+    _v3_card_date_index,
+    _v4_card_search,
+    _v5_card_data_version,
+    _v6_price_rollups,
+    _v7_outlier_bounds,
+    _v8_active_listings,
+    _v9_scrape_budget,
+    _v10_compact_sales,
+    _v11_listing_classification,
+    _v12_fair_value_models,
+    _v13_view_listing_ids,
+    _v14_active_listing_classification,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION; safe to call on every startup"""
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return
+    conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            # Take the write lock before re-checking, in case another process got here first
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn) >= version:
+                    cursor.execute("COMMIT")
+                    continue
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            logger.info(f"Migrated database to schema version {version} ({migration.__name__})")
+    finally:
+        conn.isolation_level = isolation_level
@@ -0,0 +1,106 @@
+"""Robust outlier bounds per card, computed with NumPy at ingest time and stored.
+
+Each method writes one or more (period_start, period_end, lower, upper) rows to
+outlier_bounds. Filtering a request is then a join on that table plus a range
+predicate on price, with no DataFrame and no quantiles computed per request.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+
+from units import from_day, to_day
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('iqr', 'mad', 'rolling_iqr')
+DEFAULT_METHOD = 'iqr'
+
+IQR_MULTIPLIER = 1.5
+MAD_THRESHOLD = 3.0
+# Scales MAD to match the standard deviation of normally distributed prices
+MAD_SCALE = 1.4826
+# Rolling IQR: one set of bounds per calendar month, from sales within this many days of it
+ROLLING_WINDOW_DAYS = 45
+
+# Period of the single all-history bound row, in epoch days
+ALL_TIME = (-(2 ** 31), 2 ** 31 - 1)
+
+
+def iqr_bounds(prices):
+    q1, q3 = np.percentile(prices, [25, 75])
+    spread = IQR_MULTIPLIER * (q3 - q1)
+    return q1 - spread, q3 + spread
+
+
+def mad_bounds(prices):
+    center = np.median(prices)
+    spread = MAD_THRESHOLD * MAD_SCALE * np.median(np.abs(prices - center))
+    return center - spread, center + spread
+
+
+def rolling_iqr_bounds(days, prices):
+    """IQR bounds for each month, over a window reaching ROLLING_WINDOW_DAYS either side.
+
+    `days` are sale dates as days since the epoch, sorted ascending, aligned with `prices`.
+    Yields (period_start, period_end, lower, upper). Months with no sales in reach of the
+    window (a gap in a card's history) get no row, since they have no sales to filter.
+    """
+    month = from_day(days[0]).replace(day=1)
+    last = from_day(days[-1])
+    while month <= last:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        start, end = to_day(month), to_day(next_month)
+        window = prices[np.searchsorted(days, start - ROLLING_WINDOW_DAYS, 'left'):
+                        np.searchsorted(days, end + ROLLING_WINDOW_DAYS, 'left')]
+        if len(window):
+            lower, upper = iqr_bounds(window)
+            yield start, end - 1, lower, upper
+        month = next_month
+
+
+def load_prices(conn, card_id):
+    """A card's sales as (epoch days, dollar prices) NumPy arrays sorted by sale day"""
+    rows = conn.execute('''
+        SELECT sale_day, price_cents FROM sales
+        WHERE card_id = ? AND sale_day IS NOT NULL
+        ORDER BY sale_day
+    ''', (card_id,)).fetchall()
+    data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return data[:, 0], data[:, 1] / 100
+
+
+def compute_bounds(days, prices):
+    """All stored bound rows for one card: (method, period_start, period_end, lower, upper)"""
+    if len(prices) == 0:
+        return []
+    rows = [
+        ('iqr',) + ALL_TIME + tuple(float(b) for b in iqr_bounds(prices)),
+        ('mad',) + ALL_TIME + tuple(float(b) for b in mad_bounds(prices)),
+    ]
+    rows.extend(
+        ('rolling_iqr', start, end, float(lower), float(upper))
+        for start, end, lower, upper in rolling_iqr_bounds(days, prices)
+    )
+    return rows
+
+
+def refresh_bounds(conn, card_id):
+    """Recompute and store every method's bounds for one card"""
+    days, prices = load_prices(conn, card_id)
+    conn.execute("DELETE FROM outlier_bounds WHERE card_id = ?", (card_id,))
+    conn.executemany('''
+        INSERT INTO outlier_bounds (card_id, method, period_start, period_end, lower, upper)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(card_id,) + row for row in compute_bounds(days, prices)])
+
+
+def rebuild(conn):
+    """Recompute bounds for every card"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales'").fetchone():
+        # Migrations before v10 have no sales table yet; v10 backfills once it exists
+        return
+    card_ids = [row[0] for row in conn.execute("SELECT id FROM cards")]
+    for card_id in card_ids:
+        refresh_bounds(conn, card_id)
+    logger.info(f"Rebuilt outlier bounds for {len(card_ids)} cards")
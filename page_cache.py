@@ -0,0 +1,287 @@
+"""Compressed, content-addressed on-disk cache of fetched search pages.
+
+Page bodies are stored once per distinct content under objects/, named by the
+SHA-256 of the HTML and compressed with zstd when the zstandard package is
+installed, otherwise gzip. A small SQLite index maps each URL to its current
+body along with the ETag/Last-Modified validators needed for conditional
+requests. Entries younger than the TTL are served without touching the network.
+In replay mode every fetch is served from the cache regardless of age and a miss
+is an error, so parser changes can be re-run over stored pages offline.
+
+Usage: python page_cache.py stats | prune | replay [--parser lxml]
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', 'page_cache')
+# Re-runs within this many seconds reuse stored pages without a request
+DEFAULT_TTL = int(os.environ.get('SCRAPER_CACHE_TTL', 15 * 60))
+# Compressed bytes kept on disk before the least recently used pages are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+INDEX_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        used_at REAL NOT NULL,
+        etag TEXT,
+        last_modified TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_pages_used_at ON pages(used_at);
+    CREATE TABLE IF NOT EXISTS objects (
+        content_hash TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL
+    );
+'''
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode for a URL that was never stored"""
+
+
+class CachedPage:
+    def __init__(self, url, body, fetched_at, etag, last_modified, fresh):
+        self.url = url
+        self.body = body
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    def conditional_headers(self):
+        """Validators to send so the server can answer 304 Not Modified"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def compress(body):
+    data = body.encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), '.zst'
+    return gzip.compress(data, compresslevel=6), '.gz'
+
+
+def decompress(data, path):
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return gzip.decompress(data).decode('utf-8')
+
+
+class PageCache:
+    """Thread-safe page store shared by every scrape worker"""
+
+    def __init__(self, root=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, replay=False):
+        self.root = root or CACHE_DIR
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay = replay
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.root, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(INDEX_SCHEMA)
+        self.counters = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by SCRAPER_CACHE_DIR/SCRAPER_CACHE_TTL, replaying if SCRAPER_REPLAY=1"""
+        return cls(replay=os.environ.get('SCRAPER_REPLAY') == '1')
+
+    def _read_object(self, path):
+        with open(os.path.join(self.root, path), 'rb') as f:
+            return decompress(f.read(), path)
+
+    def lookup(self, url):
+        """The stored page for `url`, or None; in replay mode a miss raises CacheMiss"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT o.path, p.fetched_at, p.etag, p.last_modified
+                FROM pages p JOIN objects o ON o.content_hash = p.content_hash
+                WHERE p.url = ?
+            ''', (url,)).fetchone()
+        if row is None:
+            if self.replay:
+                raise CacheMiss(f"No stored page for {url}")
+            self._count('misses')
+            return None
+        path, fetched_at, etag, last_modified = row
+        try:
+            body = self._read_object(path)
+        except OSError:
+            logger.warning(f"Cached object {path} is missing, dropping {url}")
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            if self.replay:
+                raise CacheMiss(f"No stored page for {url}")
+            return None
+        fresh = self.replay or time.time() - fetched_at < self.ttl
+        if fresh:
+            self.touch(url, refetched=False)
+            self._count('hits')
+        return CachedPage(url, body, fetched_at, etag, last_modified, fresh)
+
+    def touch(self, url, refetched=True):
+        """Mark a page as used; `refetched` also restarts its TTL, e.g. after a 304"""
+        now = time.time()
+        with self.lock, self.conn:
+            if refetched:
+                self.conn.execute("UPDATE pages SET used_at = ?, fetched_at = ? WHERE url = ?", (now, now, url))
+            else:
+                self.conn.execute("UPDATE pages SET used_at = ? WHERE url = ?", (now, url))
+        if refetched:
+            self._count('revalidated')
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """Save a freshly downloaded page, writing its body only if the content is new"""
+        content_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self.lock:
+            known = self.conn.execute("SELECT 1 FROM objects WHERE content_hash = ?", (content_hash,)).fetchone()
+        if not known:
+            data, suffix = compress(body)
+            path = os.path.join('objects', content_hash[:2], content_hash + suffix)
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Write then rename so a concurrent reader never sees half a file
+            temp_path = f"{full_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, full_path)
+        with self.lock, self.conn:
+            if not known:
+                self.conn.execute("INSERT OR IGNORE INTO objects (content_hash, path, size) VALUES (?, ?, ?)",
+                                  (content_hash, path, len(data)))
+            self.conn.execute('''
+                INSERT INTO pages (url, content_hash, fetched_at, used_at, etag, last_modified)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    fetched_at = excluded.fetched_at,
+                    used_at = excluded.used_at,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified
+            ''', (url, content_hash, now, now, etag, last_modified))
+        self._count('stored')
+        if not known:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used pages until stored objects fit in max_bytes"""
+        with self.lock, self.conn:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            evicted = 0
+            urls = self.conn.execute("SELECT url FROM pages ORDER BY used_at").fetchall()
+            for (url,) in urls:
+                self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                evicted += 1
+                orphans = self.conn.execute('''
+                    SELECT content_hash, path, size FROM objects
+                    WHERE content_hash NOT IN (SELECT content_hash FROM pages)
+                ''').fetchall()
+                for content_hash, path, size in orphans:
+                    self.conn.execute("DELETE FROM objects WHERE content_hash = ?", (content_hash,))
+                    try:
+                        os.remove(os.path.join(self.root, path))
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                if total <= self.max_bytes:
+                    break
+        self._count('evicted', evicted)
+        logger.info(f"Evicted {evicted} cached pages, {total} bytes remain")
+        return evicted
+
+    def pages(self):
+        """Yield (url, body) for every stored page, oldest fetch first"""
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT p.url, o.path FROM pages p JOIN objects o ON o.content_hash = p.content_hash
+                ORDER BY p.fetched_at
+            ''').fetchall()
+        for url, path in rows:
+            yield url, self._read_object(path)
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self.lock:
+            pages, objects, size = self.conn.execute('''
+                SELECT (SELECT COUNT(*) FROM pages), COUNT(*), COALESCE(SUM(size), 0) FROM objects
+            ''').fetchone()
+            stats = dict(self.counters)
+        stats.update({'pages': pages, 'objects': objects, 'bytes': size, 'max_bytes': self.max_bytes,
+                      'ttl': self.ttl, 'replay': self.replay})
+        return stats
+
+    def close(self):
+        self.conn.close()
+
+
+def replay_parser(cache, parser_name=None):
+    """Parse every stored page with the chosen backend and report item counts"""
+    from parsers import get_parser
+
+    parse = get_parser(parser_name)
+    pages = items = 0
+    start = time.perf_counter()
+    for url, body in cache.pages():
+        parsed = parse(body)
+        pages += 1
+        items += len(parsed)
+        if not parsed:
+            logger.warning(f"No items parsed from {url}")
+    elapsed = time.perf_counter() - start
+    print(f"Parsed {items} items from {pages} stored pages in {elapsed:.2f}s")
+    return pages, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay the scraper's page cache")
+    parser.add_argument('command', choices=['stats', 'prune', 'replay'])
+    parser.add_argument('--dir', default=None, help='cache directory (default: SCRAPER_CACHE_DIR or page_cache)')
+    parser.add_argument('--parser', default=None, help='parser backend to replay with')
+    parser.add_argument('--max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = PageCache(args.dir, max_bytes=args.max_mb * 1024 * 1024, replay=args.command == 'replay')
+    try:
+        if args.command == 'replay':
+            replay_parser(cache, args.parser)
+        elif args.command == 'prune':
+            cache.evict()
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import logging
+import os
+from datetime import datetime
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional; the stream backend needs only the stdlib
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+# Class names eBay puts on the parts of a search result we care about
+ITEM_CLASS = 's-item'
+TITLE_CLASS = 's-item__title'
+PRICE_CLASS = 's-item__price'
+CAPTION_CLASS = 's-item__caption--signal'
+LINK_CLASS = 's-item__link'
+
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr'
+])
+
+
+def parse_sale_date(caption_text):
+    """Parse an eBay "Sold  Mon DD, YYYY" caption into a datetime, or None"""
+    if not caption_text or 'Sold' not in caption_text:
+        return None
+    date_text = caption_text.replace('Sold', '').strip()
+    try:
+        return datetime.strptime(date_text, '%b %d, %Y')
+    except ValueError as e:
+        logger.debug(f"Could not parse date '{date_text}': {str(e)}")
+        return None
+
+
+def parse_price(price_text):
+    """Parse "$1,234.56" into a float; ranges like "$10 to $20" return None"""
+    try:
+        return float(price_text.strip().replace('$', '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _build_item(title, price_text, caption, url):
+    """Turn raw field text into an item tuple, or None if it is unusable"""
+    if title is None or price_text is None:
+        return None
+    price = parse_price(price_text)
+    if price is None:
+        return None
+    return (title.strip(), price, parse_sale_date(caption.strip() if caption else None), url)
+
+
+def parse_items_soup(html):
+    """Reference backend: html.parser soup plus per-item CSS selects"""
+    # Imported here: bs4 is slow to import and only this backend needs it
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    items = []
+    for item in soup.select('li.s-item'):
+        title_elem = item.select_one('div.s-item__title')
+        price_elem = item.select_one('span.s-item__price')
+        date_elem = item.select_one('span.s-item__caption--signal')
+        link_elem = item.select_one('a.s-item__link')
+        parsed = _build_item(
+            title_elem.text if title_elem else None,
+            price_elem.text if price_elem else None,
+            date_elem.text if date_elem else None,
+            link_elem.get('href') if link_elem else None
+        )
+        if parsed:
+            items.append(parsed)
+    return items
+
+
+def parse_items_lxml(html):
+    """lxml backend: one walk over each result's subtree, dispatching on class"""
+    root = lxml.html.document_fromstring(html)
+    items = []
+    for li in root.iter('li'):
+        if ITEM_CLASS not in li.get('class', '').split():
+            continue
+        title = price = caption = url = None
+        for el in li.iter():
+            classes = el.get('class')
+            if not classes:
+                continue
+            classes = classes.split()
+            if title is None and TITLE_CLASS in classes:
+                title = el.text_content()
+            elif price is None and PRICE_CLASS in classes:
+                price = el.text_content()
+            elif caption is None and CAPTION_CLASS in classes:
+                caption = el.text_content()
+            elif url is None and LINK_CLASS in classes:
+                url = el.get('href')
+        parsed = _build_item(title, price, caption, url)
+        if parsed:
+            items.append(parsed)
+    return items
+
+
+class _ItemTokenizer(HTMLParser):
+    """Streaming extractor: collects result fields straight off the tokenizer events"""
+
+    FIELDS = ((TITLE_CLASS, 'title'), (PRICE_CLASS, 'price'), (CAPTION_CLASS, 'caption'))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self.depth = 0
+        self.item_depth = None
+        self.fields = {}
+        self.capture = None
+        self.capture_depth = None
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        self.depth += 1
+        classes = None
+        for name, value in attrs:
+            if name == 'class' and value:
+                classes = value.split()
+                break
+        if not classes:
+            return
+        if self.item_depth is None:
+            if tag == 'li' and ITEM_CLASS in classes:
+                self.item_depth = self.depth
+                self.fields = {}
+            return
+        if self.capture is not None:
+            return
+        if LINK_CLASS in classes and 'url' not in self.fields:
+            self.fields['url'] = dict(attrs).get('href')
+        for css_class, field in self.FIELDS:
+            if css_class in classes and field not in self.fields:
+                self.capture = field
+                self.capture_depth = self.depth
+                self.buffer = []
+                break
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self.capture is not None and self.depth == self.capture_depth:
+            self.fields[self.capture] = ''.join(self.buffer)
+            self.capture = None
+        if self.item_depth is not None and self.depth == self.item_depth:
+            parsed = _build_item(self.fields.get('title'), self.fields.get('price'),
+                                 self.fields.get('caption'), self.fields.get('url'))
+            if parsed:
+                self.items.append(parsed)
+            self.item_depth = None
+        self.depth -= 1
+
+    def handle_data(self, data):
+        if self.capture is not None:
+            self.buffer.append(data)
+
+
+def parse_items_stream(html):
+    """Stream backend: stdlib tokenizer, no tree is built at all"""
+    tokenizer = _ItemTokenizer()
+    tokenizer.feed(html)
+    tokenizer.close()
+    return tokenizer.items
+
+
+PARSERS = {
+    'soup': parse_items_soup,
+    'lxml': parse_items_lxml,
+    'stream': parse_items_stream,
+}
+
+
+def available_parsers():
+    """Names of the backends usable in this environment"""
+    return [name for name in PARSERS if name != 'lxml' or lxml is not None]
+
+
+def default_parser_name():
+    """$SCRAPER_PARSER if set, else the fastest backend available"""
+    return os.environ.get('SCRAPER_PARSER') or ('lxml' if lxml is not None else 'stream')
+
+
+def get_parser(name=None):
+    """Look up a parser backend by name, defaulting to default_parser_name()"""
+    name = name or default_parser_name()
+    if name not in available_parsers():
+        raise ValueError(f"Unknown or unavailable parser backend: {name}")
+    return PARSERS[name]
@@ -0,0 +1,183 @@
+"""Scrape, parse and store as overlapping stages joined by bounded queues.
+
+Fetcher threads (the scrape engine's workers) hand raw HTML to a pool of parser
+processes, so the CPU-bound parsing runs outside the GIL, and parsed pages flow
+through a bounded queue to a single writer thread that owns the SQLite
+connection. Network, CPU and disk work overlap. When a later stage falls behind,
+its input queue fills and the stage before it blocks, so memory stays flat
+however many cards are queued.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import db
+from listing_ids import normalize_listing_id
+from parsers import default_parser_name, get_parser
+from storage import SalesWriter, save_checkpoints
+
+logger = logging.getLogger(__name__)
+
+# Parsed pages waiting for the writer; fetchers block once this many are queued
+WRITE_QUEUE_SIZE = 32
+
+
+def parse_page(parser_name, html):
+    """Process-pool entry point: parse one page with a named backend"""
+    return get_parser(parser_name)(html)
+
+
+class ProcessParser:
+    """Callable parser that runs each page in a worker process.
+
+    Every fetcher thread waits for its own page's items, because pagination
+    decisions depend on them, so at most one page per fetcher is in flight.
+    """
+
+    def __init__(self, parser=None, processes=None):
+        # Resolve the default here so every worker process uses the same backend
+        self.parser_name = parser or default_parser_name()
+        self.pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count())
+
+    def __call__(self, html):
+        return self.pool.submit(parse_page, self.parser_name, html).result()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def incremental_stop(checkpoints):
+    """Pagination rule that stops a card at its first page of already-stored sales"""
+    def should_continue(query, page, items):
+        if not items:
+            return False
+        return not checkpoints[query.card_name].page_is_known(items)
+    return should_continue
+
+
+def store_pages(conn, checkpoints, pages, idle, completed, batch_size=500):
+    """Write (card_name, items) pages as they arrive and return (inserted, duplicates).
+
+    Rows are committed as soon as `idle()` reports the input has run dry or a batch
+    fills, so under load many pages share one transaction, and when idle nothing
+    waits. Checkpoints are saved once every page has been written. Only cards in
+    `completed` (read once `pages` runs out) have their marks advanced, since a
+    card cut short by a failure or the budget still has unstored pages behind the
+    ones it reached. Cards with any page fetched are stamped as scraped.
+    """
+    seen = {}
+    writer = SalesWriter(conn, batch_size)
+    for card_name, items in pages:
+        seen.setdefault(card_name, [])
+        for title, price, sale_date, listing_url in items:
+            if not sale_date or not listing_url:
+                continue
+            writer.add(card_name, title, price, sale_date, listing_url)
+            seen[card_name].append((normalize_listing_id(listing_url), sale_date.strftime('%Y-%m-%d')))
+        if idle():
+            writer.flush()
+    writer.close()
+    for card_name, sales in seen.items():
+        checkpoint = checkpoints.get(card_name)
+        if checkpoint is None:
+            continue
+        if card_name in completed:
+            checkpoint.advance(sales)
+        checkpoint.mark_scraped()
+    save_checkpoints(conn, checkpoints.values())
+    return writer.inserted, writer.duplicates
+
+
+class WriterThread(threading.Thread):
+    """Owns the SQLite connection and writes parsed pages as they arrive (see store_pages)"""
+
+    def __init__(self, checkpoints, queue_size=WRITE_QUEUE_SIZE, path=None, conn=None):
+        super().__init__(name='sales-writer', daemon=True)
+        self.checkpoints = checkpoints
+        # Cards whose pagination finished cleanly, filled in by the scraping thread before finish()
+        self.completed = set()
+        self.path = path
+        # A long-lived caller may lend its connection (opened with check_same_thread=False)
+        self.conn = conn
+        self.pages = queue.Queue(maxsize=queue_size)
+        self.inserted = 0
+        self.duplicates = 0
+        self.error = None
+        self._stop_marker = object()
+        self._stopped = False
+
+    def submit(self, query, items):
+        """Queue a parsed page, blocking while the writer is behind"""
+        while True:
+            if self.error is not None:
+                raise RuntimeError("Sales writer stopped") from self.error
+            try:
+                self.pages.put((query, items), timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        """Write everything queued, save checkpoints and wait for the thread to exit"""
+        self.pages.put(self._stop_marker)
+        self.join()
+        if self.error is not None:
+            raise RuntimeError("Sales writer stopped") from self.error
+
+    def _pages(self):
+        while True:
+            page = self.pages.get()
+            if page is self._stop_marker:
+                self._stopped = True
+                return
+            query, items = page
+            yield query.card_name, items
+
+    def run(self):
+        conn = self.conn or db.connect(self.path)
+        try:
+            self.inserted, self.duplicates = store_pages(
+                conn, self.checkpoints, self._pages(), self.pages.empty, self.completed)
+        except Exception as e:
+            logger.error(f"Sales writer failed: {str(e)}")
+            self.error = e
+            # Keep draining so fetchers blocked on a full queue can finish
+            while not self._stopped and self.pages.get() is not self._stop_marker:
+                pass
+        finally:
+            if conn is not self.conn:
+                conn.close()
+
+
+def run_pipeline(engine, queries, checkpoints, parser=None, processes=None,
+                 max_pages=5, should_continue=None, on_page=None, parse=None, conn=None):
+    """Scrape `queries` through fetch -> parse -> write stages; returns (pages, inserted, duplicates).
+
+    Pass a ProcessParser as `parse` and a connection as `conn` to reuse them across
+    runs; both are left open for the caller.
+    """
+    own_parse = parse is None
+    parse = parse or ProcessParser(parser, processes)
+    writer = WriterThread(checkpoints, conn=conn)
+    writer.start()
+    pages = 0
+    kwargs = {'should_continue': should_continue} if should_continue else {}
+
+    def on_finished(query, complete):
+        if complete:
+            writer.completed.add(query.card_name)
+
+    try:
+        for query, page, items in engine.scrape(queries, parse, max_pages=max_pages, on_finished=on_finished,
+                                                **kwargs):
+            pages += 1
+            if on_page:
+                on_page(query, page, items)
+            writer.submit(query, items)
+    finally:
+        if own_parse:
+            parse.close()
+        writer.finish()
+    return pages, writer.inserted, writer.duplicates
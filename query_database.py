@@ -1,9 +1,9 @@
-import sqlite3
+import storage
 
 def get_all_sales():
-    conn = sqlite3.connect('card_prices.db')
+    conn = storage.connect()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM card_sales')
+    cursor.execute('SELECT * FROM card_prices')
     results = cursor.fetchall()
     conn.close()
     return results 
\ No newline at end of file
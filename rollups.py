@@ -0,0 +1,106 @@
+"""Per-card price rollups (count, min, max, mean, median, trimmed mean) by day, week and month.
+
+Rollups are refreshed at ingest time for just the buckets a batch touched, so chart
+endpoints can serve a bounded number of points however long a card's history is.
+"""
+import logging
+from datetime import timedelta
+from statistics import median
+
+from units import from_cents, from_day, to_day
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('day', 'week', 'month')
+
+# Share of prices cut from each end before taking the trimmed mean
+TRIM_FRACTION = 0.1
+
+UPSERT_SQL = '''
+    INSERT INTO price_rollups
+    (card_id, resolution, bucket_start, sale_count, min_price, max_price,
+     mean_price, median_price, trimmed_mean_price)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(card_id, resolution, bucket_start) DO UPDATE SET
+        sale_count = excluded.sale_count,
+        min_price = excluded.min_price,
+        max_price = excluded.max_price,
+        mean_price = excluded.mean_price,
+        median_price = excluded.median_price,
+        trimmed_mean_price = excluded.trimmed_mean_price
+'''
+
+
+def bucket_range(sale_day, resolution):
+    """Return the (first_day, last_day) dates of the bucket holding epoch day `sale_day`"""
+    day = from_day(sale_day)
+    if resolution == 'day':
+        start, end = day, day
+    elif resolution == 'week':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=6)
+    elif resolution == 'month':
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    else:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    return start, end
+
+
+def trimmed_mean(sorted_prices, fraction=TRIM_FRACTION):
+    cut = int(len(sorted_prices) * fraction)
+    kept = sorted_prices[cut:len(sorted_prices) - cut] or sorted_prices
+    return sum(kept) / len(kept)
+
+
+def summarize(prices_cents):
+    """Rollup columns, in dollars, for one bucket's prices in cents"""
+    prices = sorted(from_cents(cents) for cents in prices_cents)
+    return (
+        len(prices),
+        prices[0],
+        prices[-1],
+        sum(prices) / len(prices),
+        median(prices),
+        trimmed_mean(prices),
+    )
+
+
+def refresh_buckets(conn, card_id, sale_days):
+    """Recompute every rollup bucket that contains one of the epoch days `sale_days` for a card"""
+    buckets = {
+        (resolution, bucket_range(sale_day, resolution))
+        for sale_day in set(sale_days) if sale_day is not None
+        for resolution in RESOLUTIONS
+    }
+    for resolution, (start, end) in buckets:
+        prices = [row[0] for row in conn.execute('''
+            SELECT price_cents FROM sales
+            WHERE card_id = ? AND sale_day BETWEEN ? AND ?
+        ''', (card_id, to_day(start), to_day(end)))]
+        if prices:
+            conn.execute(UPSERT_SQL, (card_id, resolution, start.isoformat()) + summarize(prices))
+
+
+def rebuild(conn, card_ids=None):
+    """Recompute all rollups from sales, for every card or just `card_ids`"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales'").fetchone():
+        # Migrations before v10 have no sales table yet; v10 backfills once it exists
+        return
+    if card_ids is None:
+        card_ids = [row[0] for row in conn.execute("SELECT id FROM cards")]
+    for card_id in card_ids:
+        conn.execute("DELETE FROM price_rollups WHERE card_id = ?", (card_id,))
+        groups = {}
+        for sale_day, price_cents in conn.execute('''
+            SELECT sale_day, price_cents FROM sales
+            WHERE card_id = ? AND sale_day IS NOT NULL
+        ''', (card_id,)):
+            for resolution in RESOLUTIONS:
+                start = bucket_range(sale_day, resolution)[0].isoformat()
+                groups.setdefault((resolution, start), []).append(price_cents)
+        conn.executemany(UPSERT_SQL, [
+            (card_id, resolution, start) + summarize(prices)
+            for (resolution, start), prices in groups.items()
+        ])
+    logger.info(f"Rebuilt price rollups for {len(card_ids)} cards")
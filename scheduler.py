@@ -0,0 +1,125 @@
+"""Daily call budget and refresh ordering for the scraper.
+
+eBay allows 5,000 calls a day. DailyBudget counts every request attempt (retries
+included) in the database, so separate scraper processes share one budget, and
+prioritize() orders cards so that when the budget runs short, it is spent on the
+cards that are most stale and whose prices move the most.
+"""
+import logging
+import math
+import threading
+from datetime import datetime
+
+import db
+from migrations import migrate
+from storage import ensure_checkpoint_table
+
+logger = logging.getLogger(__name__)
+
+DAILY_CALL_LIMIT = 5000
+
+# How much a card's price volatility (coefficient of variation) boosts its priority
+VOLATILITY_WEIGHT = 4.0
+# Weeks of rollups used to judge volatility
+VOLATILITY_WEEKS = 12
+
+SPEND_SQL = '''
+    INSERT INTO scrape_budget (day, calls) VALUES (?, 1)
+    ON CONFLICT(day) DO UPDATE SET calls = calls + 1 WHERE calls < ?
+'''
+
+RECORD_SQL = '''
+    INSERT INTO scrape_budget (day, calls) VALUES (?, ?)
+    ON CONFLICT(day) DO UPDATE SET calls = calls + excluded.calls
+'''
+
+
+def _today():
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+
+class DailyBudget:
+    """Persistent per-UTC-day request counter that refuses calls past the limit"""
+
+    def __init__(self, limit=DAILY_CALL_LIMIT, path=None):
+        self.limit = limit
+        # Shared by every scrape worker thread, so calls go through the lock
+        self.conn = db.connect(path, check_same_thread=False)
+        migrate(self.conn)
+        self.lock = threading.Lock()
+
+    def spend(self):
+        """Record one call; False (and nothing recorded) if today's budget is used up"""
+        with self.lock, self.conn:
+            return self.conn.execute(SPEND_SQL, (_today(), self.limit)).rowcount == 1
+
+    def record(self, calls):
+        """Add calls that were made against a share of the budget handed out earlier"""
+        if calls:
+            with self.lock, self.conn:
+                self.conn.execute(RECORD_SQL, (_today(), calls))
+
+    def used(self):
+        with self.lock:
+            row = self.conn.execute("SELECT calls FROM scrape_budget WHERE day = ?", (_today(),)).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self):
+        return max(0, self.limit - self.used())
+
+    def close(self):
+        self.conn.close()
+
+
+def volatility(conn):
+    """Coefficient of variation of each card's recent weekly median price, by card name"""
+    prices = {}
+    for name, median_price in conn.execute(f'''
+        SELECT c.name, r.median_price
+        FROM price_rollups r
+        JOIN cards c ON c.id = r.card_id
+        WHERE r.resolution = 'week' AND r.bucket_start >= date('now', '-{VOLATILITY_WEEKS * 7} days')
+    '''):
+        prices.setdefault(name, []).append(median_price)
+    result = {}
+    for name, values in prices.items():
+        mean = sum(values) / len(values)
+        if len(values) > 1 and mean > 0:
+            variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+            result[name] = math.sqrt(variance) / mean
+        else:
+            result[name] = 0.0
+    return result
+
+
+def staleness_hours(conn):
+    """Hours since each card was last scraped, by card name"""
+    return {
+        name: max(0.0, hours) for name, hours in conn.execute('''
+            SELECT card_name, (julianday('now') - julianday(last_scraped_at)) * 24
+            FROM scrape_checkpoints
+            WHERE last_scraped_at IS NOT NULL
+        ''')
+    }
+
+
+def priority(stale_hours, cv):
+    """Higher is more urgent; cards never scraped always come first"""
+    if stale_hours is None:
+        return math.inf
+    return stale_hours * (1 + VOLATILITY_WEIGHT * cv)
+
+
+def prioritize(conn, queries):
+    """Order card queries most urgent first: stalest and most volatile cards lead"""
+    migrate(conn)
+    ensure_checkpoint_table(conn)
+    stale = staleness_hours(conn)
+    cvs = volatility(conn)
+    ranked = sorted(
+        queries,
+        key=lambda query: priority(stale.get(query.card_name), cvs.get(query.card_name, 0.0)),
+        reverse=True
+    )
+    logger.debug(f"Refresh order: {[query.card_name for query in ranked]}")
+    return ranked
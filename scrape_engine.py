@@ -0,0 +1,365 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = 'https://www.ebay.com/sch/i.html'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+    'DNT': '1'
+}
+
+# A card to track: the name rows are stored under and the eBay keywords to search for
+CardQuery = namedtuple('CardQuery', ['card_name', 'search_terms', 'sold'], defaults=[True])
+
+
+def build_search_url(query, page=1, base_url=SEARCH_URL):
+    """Build the eBay search URL for one page of a card query"""
+    params = {'_nkw': query.search_terms, '_sacat': 0}
+    if query.sold:
+        params['LH_Complete'] = 1
+        params['LH_Sold'] = 1
+        # Newest sales first, so incremental runs can stop at the first fully-known page
+        params['_sop'] = 13
+    params['_pgn'] = page
+    return f"{base_url}?{urlencode(params)}"
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursting up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows by one slot per window of successes and halves on congestion"""
+
+    def __init__(self, initial=2, minimum=1, maximum=8, decrease=0.5, cooldown=1.0):
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        # A burst of 429s from one overload should only cut the limit once
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, congested=False):
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested:
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+
+class Slot:
+    """One in-flight request; mark it congested when the host pushes back"""
+
+    def __init__(self):
+        self.congested = False
+
+
+class HostLimiter:
+    """Caps in-flight requests (adaptively) and request rate separately for every host"""
+
+    def __init__(self, max_per_host=4, rate=2.0, burst=4):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.burst = burst
+        self.limiters = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = AIMDLimiter(maximum=self.max_per_host)
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.limiters[host], self.buckets[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Hold one of the host's concurrency slots and spend one of its rate tokens"""
+        limiter, bucket = self._host_state(urlsplit(url).netloc)
+        limiter.acquire()
+        slot = Slot()
+        try:
+            bucket.acquire()
+            yield slot
+        except Exception:
+            slot.congested = True
+            raise
+        finally:
+            limiter.release(slot.congested)
+
+    def limits(self):
+        with self.lock:
+            return {host: round(limiter.limit, 2) for host, limiter in self.limiters.items()}
+
+
+class BudgetExhausted(Exception):
+    """The daily call budget is spent; no more requests until it resets"""
+
+
+class RetryableError(Exception):
+    """A 429/5xx or connection failure worth retrying after a backoff"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Statuses that mean "slow down or try again", as opposed to a bad request
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, retry_after=None):
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def stop_on_empty_page(query, page, items):
+    """Default pagination rule: keep going while pages still return items"""
+    return bool(items)
+
+
+class ScrapeEngine:
+    """Fetches search result pages for many card queries concurrently over pooled connections"""
+
+    def __init__(self, max_workers=8, max_per_host=4, rate=2.0, burst=4, timeout=20,
+                 base_url=SEARCH_URL, session=None, budget=None, max_retries=4,
+                 backoff_base=1.0, backoff_cap=60.0, cache=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.base_url = base_url
+        self.limiter = HostLimiter(max_per_host=max_per_host, rate=rate, burst=burst)
+        self.session = session or self._make_session(max_workers)
+        # Anything with spend() -> bool, e.g. scheduler.DailyBudget; every attempt costs one call
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # Optional page_cache.PageCache; fresh pages skip the network and stale ones are revalidated
+        self.cache = cache
+        self.exhausted = threading.Event()
+        self.counter_lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'congested': 0, 'failed': 0}
+
+    @staticmethod
+    def _make_session(pool_size):
+        """Create a Session whose keep-alive pool is big enough for every worker"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(HEADERS)
+        return session
+
+    def _count(self, name):
+        with self.counter_lock:
+            self.counters[name] += 1
+
+    def _attempt(self, url, cached=None):
+        """One request within the host's limits; congestion raises RetryableError"""
+        if self.exhausted.is_set() or (self.budget is not None and not self.budget.spend()):
+            self.exhausted.set()
+            raise BudgetExhausted("Daily call budget exhausted")
+        self._count('requests')
+        with self.limiter.slot(url) as slot, metrics.timer('scrape_fetch_seconds'):
+            try:
+                headers = cached.conditional_headers() if cached else None
+                response = self.session.get(url, timeout=self.timeout, headers=headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                slot.congested = True
+                metrics.inc('scrape_requests_total', outcome='connection_error')
+                raise RetryableError(str(e))
+            if response.status_code in RETRY_STATUSES:
+                slot.congested = True
+                metrics.inc('scrape_requests_total', outcome='congested')
+                raise RetryableError(f"HTTP {response.status_code}", _retry_after(response))
+        if response.status_code == 304 and cached:
+            metrics.inc('scrape_requests_total', outcome='not_modified')
+            metrics.inc('scrape_pages_total', source='revalidated')
+            self.cache.touch(url)
+            return cached.body
+        metrics.inc('scrape_requests_total', outcome='ok' if response.ok else 'error')
+        response.raise_for_status()
+        metrics.inc('scrape_pages_total', source='network')
+        if self.cache:
+            self.cache.store(url, response.text, response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'))
+        return response.text
+
+    def fetch(self, url):
+        """Fetch one page, backing off and retrying on 429/5xx and connection errors"""
+        cached = self.cache.lookup(url) if self.cache else None
+        if cached and cached.fresh:
+            metrics.inc('scrape_pages_total', source='cache')
+            return cached.body
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._attempt(url, cached)
+            except RetryableError as e:
+                self._count('congested')
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, e.retry_after)
+                logger.warning(f"{str(e)} for {url}, retrying in {delay:.1f}s")
+                self._count('retries')
+                time.sleep(delay)
+
+    def stats(self):
+        with self.counter_lock:
+            stats = dict(self.counters)
+        stats['host_limits'] = self.limiter.limits()
+        stats['budget_exhausted'] = self.exhausted.is_set()
+        if self.cache:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+    def _paginate(self, query, max_pages, parse, should_continue, put):
+        """Walk one query's pages in order until `should_continue` says stop.
+
+        Returns True if pagination finished cleanly, at a stopping page or at
+        `max_pages`, and False if a failure or the call budget cut it short.
+        """
+        for page in range(1, max_pages + 1):
+            url = build_search_url(query, page, self.base_url)
+            try:
+                html = self.fetch(url)
+                with metrics.timer('scrape_parse_seconds'):
+                    items = parse(html)
+            except BudgetExhausted:
+                logger.warning(f"Call budget exhausted, skipping the rest of {query.card_name}")
+                return False
+            except Exception as e:
+                logger.error(f"Error fetching {query.card_name} page {page}: {str(e)}")
+                return False
+            if not put((query, page, items)):
+                return False
+            if not should_continue(query, page, items):
+                logger.info(f"Stopping {query.card_name} after page {page}")
+                return True
+        return True
+
+    def scrape(self, queries, parse, max_pages=5, should_continue=stop_on_empty_page, queue_size=64,
+               on_finished=None):
+        """Scrape every query concurrently, yielding (query, page, items) as pages finish.
+
+        Each query paginates on its own worker, so one query stopping early never
+        holds up the others. Queries start in the order given, so put the most
+        important first when a call budget may run out. Results are yielded on the
+        calling thread, which makes it safe to write them to SQLite from the loop body.
+        At most `queue_size` parsed pages wait to be consumed; past that, workers
+        block until the caller catches up, so a slow consumer throttles fetching.
+        `on_finished(query, complete)` is called on the calling thread after a query's
+        last page has been yielded; `complete` is False if its pagination was cut short.
+        """
+        results = queue.Queue(maxsize=queue_size)
+        cancelled = threading.Event()
+        done = object()
+
+        def put(result):
+            """Hand a result to the consumer, giving up if it has stopped listening"""
+            while not cancelled.is_set():
+                try:
+                    results.put(result, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def run(query):
+            complete = False
+            try:
+                if not cancelled.is_set():
+                    complete = self._paginate(query, max_pages, parse, should_continue, put)
+            finally:
+                put((done, query, complete))
+
+        queries = list(queries)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                for query in queries:
+                    pool.submit(run, query)
+                remaining = len(queries)
+                while remaining:
+                    result = results.get()
+                    if result[0] is done:
+                        remaining -= 1
+                        if on_finished:
+                            on_finished(*result[1:])
+                        continue
+                    yield result
+            finally:
+                # Lets blocked workers exit if the caller stops iterating early
+                cancelled.set()
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
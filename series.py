@@ -0,0 +1,115 @@
+"""Compact columnar chart series, built straight from SQLite rows.
+
+A series is a set of parallel integer columns: epoch days and prices in cents,
+exactly as sales are stored, so nothing is converted or formatted per point:
+
+    {"card_name": "...", "resolution": "raw", "encoding": "delta",
+     "columns": {"days": [20089, 0, 3, ...], "cents": [11888, -250, 1210, ...]}}
+
+With the delta encoding each column holds its first value followed by the
+differences between neighbours. Points are sorted by day, so the day column
+becomes a run of small numbers that compresses far better. Clients rebuild
+the values with a running sum (decode_columns here, decodeSeries in the page).
+Payloads are compressed with brotli when the client accepts it and the
+`brotli` package is installed, with gzip otherwise.
+"""
+import gzip
+import json
+
+from units import to_cents, to_day
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+ENCODINGS = ('plain', 'delta')
+
+# Payloads smaller than this are sent uncompressed; the header overhead is not worth it
+MIN_COMPRESS_BYTES = 512
+
+RAW_SERIES_SQL = '''
+    SELECT sale_day, price_cents
+    FROM sales
+    WHERE card_id = ? AND sale_day IS NOT NULL
+    ORDER BY sale_day DESC, id
+    '''
+
+
+def delta_encode(values):
+    previous = 0
+    encoded = []
+    for value in values:
+        encoded.append(value - previous)
+        previous = value
+    return encoded
+
+
+def delta_decode(values):
+    total = 0
+    decoded = []
+    for value in values:
+        total += value
+        decoded.append(total)
+    return decoded
+
+
+def encode_columns(columns, encoding='plain'):
+    if encoding == 'delta':
+        return {name: delta_encode(values) for name, values in columns.items()}
+    return columns
+
+
+def decode_columns(columns, encoding='plain'):
+    if encoding == 'delta':
+        return {name: delta_decode(values) for name, values in columns.items()}
+    return columns
+
+
+def raw_columns(conn, card_id):
+    """Every sale of a card as oldest-first day and cent columns"""
+    rows = conn.execute(RAW_SERIES_SQL, (card_id,)).fetchall()
+    # Read newest-first along the (card_id, sale_day DESC) index, then flip
+    rows.reverse()
+    return {'days': [row[0] for row in rows], 'cents': [row[1] for row in rows]}
+
+
+def rollup_columns(rows):
+    """Oldest-first columns from price_rollups rows (newest-first, prices in dollars)"""
+    rows = list(reversed(rows))
+    return {
+        'days': [to_day(row['bucket_start']) for row in rows],
+        'count': [row['sale_count'] for row in rows],
+        'min_cents': [to_cents(row['min_price']) for row in rows],
+        'median_cents': [to_cents(row['median_price']) for row in rows],
+        'max_cents': [to_cents(row['max_price']) for row in rows],
+    }
+
+
+def payload(card_name, resolution, columns, encoding='plain'):
+    """The series as compact JSON bytes"""
+    return json.dumps({
+        'card_name': card_name,
+        'resolution': resolution,
+        'encoding': encoding,
+        'columns': encode_columns(columns, encoding),
+    }, separators=(',', ':')).encode()
+
+
+def content_encoding(accept_encoding):
+    """Best compression the client accepts: 'br', 'gzip' or None"""
+    accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """(body, encoding) with `encoding` applied, or the body untouched when it is small"""
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=9), 'br'
+    return gzip.compress(body, compresslevel=9, mtime=0), 'gzip'
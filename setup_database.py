@@ -1,6 +1,7 @@
-import sqlite3
 import logging
 
+import storage
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -11,35 +12,14 @@ logger = logging.getLogger(__name__)
 def setup_database():
     """Create and set up the database with proper schema"""
     try:
-        # Connect to database
-        conn = sqlite3.connect('card_prices.db')
+        # Drop everything and rebuild the schema from the migrations
+        conn = storage.connect()
+        storage.reset_database(conn)
         cursor = conn.cursor()
-        
-        # Drop existing table if it exists
-        cursor.execute('DROP TABLE IF EXISTS card_prices')
-        
-        # Create new table with proper schema
-        cursor.execute('''
-            CREATE TABLE card_prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                card_name TEXT NOT NULL,
-                title TEXT NOT NULL,
-                price REAL NOT NULL,
-                sale_date TEXT NOT NULL,
-                listing_url TEXT NOT NULL,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        
-        # Create indexes for common queries
-        cursor.execute('CREATE INDEX idx_sale_date ON card_prices(sale_date)')
-        cursor.execute('CREATE INDEX idx_price ON card_prices(price)')
-        
-        conn.commit()
         logger.info("Database setup completed successfully")
         
         # Verify the table structure
-        cursor.execute("PRAGMA table_info(card_prices)")
+        cursor.execute("PRAGMA table_info(sales)")
         columns = cursor.fetchall()
         print("\nDatabase structure:")
         print("=" * 50)
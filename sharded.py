@@ -0,0 +1,289 @@
+"""Sharded scraping: several scraper processes feeding one writer process.
+
+Each worker process owns a share of the cards. It fetches and parses its own
+pages, so parsing scales with cores, and sends every parsed page over a
+multiprocessing queue. One writer process holds the only write connection to
+the database (in WAL mode). It group-commits whatever has arrived each time the
+queue runs dry or a batch fills, so scrapers never contend for the write lock,
+and a crashed scraper cannot leave a half-written journal behind.
+
+Workers do not touch the database at all. Their share of the day's call budget
+is handed to them up front and spent in memory, and the calls they made are
+recorded once every process has finished. Per-host rate limits are split
+between the workers, so eBay sees the same total rate as one process.
+
+Usage: python sharded.py [--watchlist watchlist.toml] [--workers N] [--max-pages 5] [--full]
+"""
+import argparse
+import inspect
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from multiprocessing.connection import wait
+
+import db
+import storage
+from logs import setup_logging
+from page_cache import PageCache
+from parsers import get_parser
+from pipeline import incremental_stop, store_pages
+from scheduler import DailyBudget, prioritize
+from scrape_engine import ScrapeEngine, stop_on_empty_page
+from storage import load_checkpoints
+from watchlist import WATCHLIST_PATH, load_watchlist
+
+logger = logging.getLogger(__name__)
+
+# Parsed pages in flight between the workers and the writer; workers block once it is full
+PAGE_QUEUE_SIZE = 64
+# Rows per transaction when pages arrive faster than the writer drains them
+GROUP_COMMIT_ROWS = 2000
+# How often the parent checks that the writer is still alive while waiting for its report
+REPORT_POLL_SECONDS = 1.0
+
+
+class Allowance:
+    """A worker's fixed share of the daily call budget, spent in memory"""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def spend(self):
+        with self.lock:
+            if self.spent >= self.calls:
+                return False
+            self.spent += 1
+            return True
+
+
+def shard(queries, workers):
+    """Deal `queries` out round-robin, so each worker gets an even share of the priority order"""
+    shards = [queries[i::workers] for i in range(workers)]
+    return [queries for queries in shards if queries]
+
+
+def worker_engine_options(engine_options, workers):
+    """ScrapeEngine options for each worker, with the per-host limits divided between them"""
+    defaults = inspect.signature(ScrapeEngine).parameters
+    options = dict(engine_options or {})
+    limits = {name: options.get(name, defaults[name].default) for name in ('rate', 'burst', 'max_per_host')}
+    options['rate'] = limits['rate'] / workers
+    options['burst'] = max(1, limits['burst'] // workers)
+    options['max_per_host'] = max(1, limits['max_per_host'] // workers)
+    return options
+
+
+class Inbox:
+    """Pages arriving from the workers, until each of them has sent its final report"""
+
+    def __init__(self, pages, workers):
+        self.pages = pages
+        self.workers = workers
+        self.reports = []
+        # Cards whose pagination finished cleanly, as each worker reports them
+        self.completed = set()
+
+    def __iter__(self):
+        while len(self.reports) < self.workers:
+            card_name, items = self.pages.get()
+            if card_name is None:
+                self.reports.append(items)
+                self.completed.update(items.pop('completed', ()))
+            else:
+                yield card_name, items
+
+    def empty(self):
+        return self.pages.empty()
+
+    def drain(self):
+        for _ in self:
+            pass
+
+
+def scrape_shard(index, queries, checkpoints, pages, max_pages, parser, incremental, calls, engine_options):
+    """Worker process: scrape one shard's cards and send each parsed page to the writer"""
+    setup_logging()
+    allowance = Allowance(calls)
+    # Each worker opens the shared page cache itself unless told otherwise ('cache': None turns it off)
+    options = dict(engine_options)
+    if 'cache' not in options:
+        options['cache'] = PageCache.from_env()
+    engine = ScrapeEngine(budget=allowance, **options)
+    should_continue = incremental_stop(checkpoints) if incremental else stop_on_empty_page
+    report = {'shard': index, 'cards': len(queries), 'pages': 0, 'error': None, 'completed': []}
+
+    def on_finished(query, complete):
+        if complete:
+            report['completed'].append(query.card_name)
+
+    try:
+        for query, page, items in engine.scrape(queries, get_parser(parser), max_pages=max_pages,
+                                                should_continue=should_continue, on_finished=on_finished):
+            report['pages'] += 1
+            pages.put((query.card_name, items))
+    except Exception as e:
+        logger.error(f"Shard {index} failed: {str(e)}")
+        report['error'] = str(e)
+    finally:
+        report['calls'] = allowance.spent
+        engine.close()
+        # The writer counts these to know when every worker is done
+        pages.put((None, report))
+
+
+def write_shards(path, checkpoints, pages, workers, results):
+    """Writer process: store every worker's pages through one connection, then report"""
+    setup_logging()
+    inbox = Inbox(pages, workers)
+    conn = None
+    try:
+        conn = storage.connect(path)
+        inserted, duplicates = store_pages(conn, checkpoints, inbox, inbox.empty, inbox.completed,
+                                          GROUP_COMMIT_ROWS)
+        # Nothing else is writing now, so fold the WAL back into the database file
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        results.put({'inserted': inserted, 'duplicates': duplicates, 'error': None, 'shards': inbox.reports})
+    except Exception as e:
+        logger.error(f"Sales writer failed: {str(e)}")
+        # Keep draining so workers blocked on a full queue can finish
+        inbox.drain()
+        results.put({'inserted': 0, 'duplicates': 0, 'error': str(e), 'shards': inbox.reports})
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def wait_for_shards(processes, shards, writer, pages):
+    """Join every worker, reporting for any that crashed; raises if the writer dies first"""
+    running = {process.sentinel: index for index, process in enumerate(processes)}
+    while running:
+        ready = wait(list(running) + [writer.sentinel])
+        for sentinel in ready:
+            index = running.pop(sentinel, None)
+            if index is None:
+                continue
+            process = processes[index]
+            process.join()
+            if process.exitcode != 0:
+                # Killed before it could report; report for it so the writer does not wait forever
+                logger.error(f"Shard {index} exited with code {process.exitcode}")
+                pages.put((None, {'shard': index, 'cards': len(shards[index]), 'pages': None,
+                                  'error': f"exited with code {process.exitcode}", 'calls': 0}))
+        if running and writer.sentinel in ready:
+            writer.join()
+            if writer.exitcode != 0:
+                # Workers still running are blocked on a queue nobody reads any more
+                for index in running.values():
+                    processes[index].terminate()
+                raise RuntimeError(f"Sales writer exited with code {writer.exitcode}")
+            # The writer finished after every report arrived; the rest are just exiting
+            for index in running.values():
+                processes[index].join()
+            return
+
+
+def wait_for_report(writer, results):
+    """The writer's report; raises if the writer process dies without sending one"""
+    while True:
+        try:
+            report = results.get(timeout=REPORT_POLL_SECONDS)
+            break
+        except queue.Empty:
+            if writer.is_alive():
+                continue
+            # A report sent just before exiting may still be in the pipe
+            try:
+                report = results.get(timeout=REPORT_POLL_SECONDS)
+                break
+            except queue.Empty:
+                raise RuntimeError(f"Sales writer exited with code {writer.exitcode} without reporting")
+    writer.join()
+    if writer.exitcode != 0:
+        logger.error(f"Sales writer exited with code {writer.exitcode} after reporting")
+        report['error'] = report['error'] or f"writer exited with code {writer.exitcode}"
+    return report
+
+
+def run_sharded(queries, workers=None, max_pages=5, parser=None, incremental=True, path=None,
+                engine_options=None):
+    """Scrape `queries` in `workers` processes (default: one per core) through one writer process.
+
+    Returns the writer's report: rows inserted, duplicates, and each shard's pages,
+    calls and error. `engine_options` are ScrapeEngine arguments for the whole run;
+    the per-host limits among them are split between the workers.
+    """
+    # Resolved here, since spawned processes do not see a DB_PATH changed at runtime
+    path = path or db.DB_PATH
+    conn = None
+    try:
+        conn = storage.connect(path)
+        # Migrate and read everything the workers need before any process starts
+        queries = prioritize(conn, queries)
+        checkpoints = load_checkpoints(conn, [query.card_name for query in queries])
+    finally:
+        if conn is not None:
+            conn.close()
+    shards = shard(queries, workers or os.cpu_count())
+    if not shards:
+        return {'inserted': 0, 'duplicates': 0, 'error': None, 'shards': []}
+    budget = DailyBudget(path=path)
+    remaining = budget.remaining()
+    options = worker_engine_options(engine_options, len(shards))
+
+    # Fresh interpreters, so no worker inherits the parent's connections or locks
+    context = multiprocessing.get_context('spawn')
+    pages = context.Queue(maxsize=PAGE_QUEUE_SIZE)
+    results = context.Queue()
+    writer = context.Process(target=write_shards, name='sales-writer',
+                             args=(path, checkpoints, pages, len(shards), results))
+    writer.start()
+    processes = []
+    for index, cards in enumerate(shards):
+        share = remaining // len(shards) + (index < remaining % len(shards))
+        cards_checkpoints = {query.card_name: checkpoints[query.card_name] for query in cards}
+        process = context.Process(target=scrape_shard, name=f'scrape-shard-{index}', args=(
+            index, cards, cards_checkpoints, pages, max_pages, parser, incremental, share, options))
+        process.start()
+        processes.append(process)
+    logger.info(f"Scraping {len(queries)} cards in {len(shards)} processes")
+
+    try:
+        wait_for_shards(processes, shards, writer, pages)
+        report = wait_for_report(writer, results)
+        budget.record(sum(shard_report['calls'] for shard_report in report['shards']))
+    finally:
+        budget.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--watchlist', default=None, help='watchlist file (default: $WATCHLIST_PATH or watchlist.toml)')
+    parser.add_argument('--workers', type=int, default=None, help='scraper processes (default: one per core)')
+    parser.add_argument('--max-pages', type=int, default=None,
+                        help="pages per card (default: the watchlist's largest max_pages)")
+    parser.add_argument('--parser', default=None, help='item parser backend (see parsers.PARSERS)')
+    parser.add_argument('--full', action='store_true', help='scrape every page, not just the ones since the last run')
+    args = parser.parse_args()
+
+    setup_logging(log_file='scraper.log')
+    entries = load_watchlist(args.watchlist or WATCHLIST_PATH)
+    max_pages = args.max_pages or max(entry.max_pages for entry in entries)
+    report = run_sharded([entry.query for entry in entries], args.workers, max_pages, args.parser,
+                         incremental=not args.full)
+    for shard_report in report['shards']:
+        outcome = f"failed: {shard_report['error']}" if shard_report['error'] else 'ok'
+        logger.info(f"Shard {shard_report['shard']}: {shard_report['cards']} cards, {shard_report['pages']} pages, "
+                    f"{shard_report['calls']} calls, {outcome}")
+    logger.info(f"Finished sharded scrape: {report['inserted']} new, {report['duplicates']} duplicates")
+    failed = report['error'] or any(shard_report['error'] for shard_report in report['shards'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,43 +1,29 @@
 import requests
-from bs4 import BeautifulSoup
-import sqlite3
 from datetime import datetime, timedelta
-import time
-import random
 import logging
 import re
-import sys
+from logs import setup_logging
+import metrics
+from page_cache import PageCache
+from parsers import get_parser
+from pipeline import incremental_stop, run_pipeline
+from scrape_engine import CardQuery, HEADERS, ScrapeEngine, build_search_url, stop_on_empty_page
+from scheduler import DailyBudget, prioritize
+import storage
+from storage import SalesWriter, load_checkpoints
+
+# Set up logging to both file and console; per-page and per-item lines are rate limited
+setup_logging(log_file='scraper.log')
+logger = logging.getLogger(__name__)
 
-# Set up logging to both file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('scraper.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+WEMBY_QUERY = CardQuery(
+    card_name='victor wembanyama prizm #136 silver prizm psa 10 rc',
+    search_terms='victor webanyama prizm #136 silver prizm psa 10 rc'
 )
-logger = logging.getLogger(__name__)
 
 def setup_database():
-    """Set up SQLite database with proper schema"""
-    conn = sqlite3.connect('card_prices.db')
-    cursor = conn.cursor()
-    
-    # Create table with proper column types
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS card_prices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            card_name TEXT NOT NULL,
-            title TEXT NOT NULL,
-            price REAL NOT NULL,
-            sale_date TEXT,  # Allow NULL sale dates
-            listing_url TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-    ''')
-    
-    conn.commit()
+    """Open card_prices.db with every table created or migrated to the current schema"""
+    conn = storage.connect()
     logger.info("Database setup completed successfully")
     return conn
 
@@ -77,230 +63,103 @@ def is_within_six_months(date_text):
         logger.error(f"Error processing date {date_text}: {str(e)}")
         return False
 
-def get_ebay_sales():
-    """Scrape eBay for Victor Wembanyama #136 Silver Prizm RC PSA 10 sales"""
-    print("Starting scraper...")
+def get_ebay_sales(parser=None, query=None):
+    """Scrape one page of eBay sold listings for a card (Victor Wembanyama #136 Silver Prizm RC PSA 10 by default)"""
+    logger.info("Starting scraper...")
+    query = query or WEMBY_QUERY
     # Set up the request
-    url = "https://www.ebay.com/sch/i.html?_nkw=victor+webanyama+prizm+%23136+silver+prizm+psa+10+rc&_sacat=0&_from=R40&_trksid=m570.l1313&_odkw=victor+webanyama+prizm+%23+136+silver+prizm+psa+10+rc&_osacat=0&LH_Complete=1&LH_Sold=1"
-    print(f"Search URL: {url}")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Cache-Control': 'max-age=0',
-        'DNT': '1'
-    }
+    url = build_search_url(query)
+    logger.info(f"Search URL: {url}")
 
     try:
         # Make the request
-        print("Making request to eBay...")
         logger.info("Fetching eBay sales data...")
-        response = requests.get(url, headers=headers)
+        with metrics.timer('scrape_fetch_seconds'):
+            response = requests.get(url, headers=HEADERS)
         response.raise_for_status()
-        print(f"Response status code: {response.status_code}")
         logger.info(f"Response status code: {response.status_code}")
 
-        # Parse the HTML
-        print("Parsing HTML response...")
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find all sold items using the correct selector
-        items = soup.select('li.s-item')
-        print(f"Found {len(items)} items")
+        # Parse the HTML in a single pass with the selected backend
+        with metrics.timer('scrape_parse_seconds'):
+            items = get_parser(parser)(response.text)
         logger.info(f"Found {len(items)} items")
 
-        # Connect to database
-        conn = sqlite3.connect('card_prices.db')
-        cursor = conn.cursor()
+        # Connect to database; rows are buffered and written in one transaction
+        conn = storage.connect()
+        writer = SalesWriter(conn)
         
-        # Process each item
-        for item in items:
+        # Process each item; per-item detail is only formatted when DEBUG is on
+        verbose = logger.isEnabledFor(logging.DEBUG)
+        for title, price, sale_date, listing_url in items:
             try:
-                # Get title
-                title_elem = item.select_one('div.s-item__title')
-                if not title_elem:
-                    continue
-                title = title_elem.text.strip()
-                print(f"Processing item: {title}")
-
-                # Get price
-                price_elem = item.select_one('span.s-item__price')
-                if not price_elem:
-                    continue
-                price_text = price_elem.text.strip()
-                price = float(price_text.replace('$', '').replace(',', ''))
-                print(f"Price: ${price}")
-
-                # Get sale date
-                date_elem = item.select_one('span.s-item__caption--signal')
-                sale_date = None
-                if date_elem:
-                    date_text = date_elem.text.strip()
-                    if 'Sold' in date_text:
-                        # Extract the date part after "Sold"
-                        date_text = date_text.replace('Sold', '').strip()
-                        try:
-                            # Parse the date (format: "MMM DD, YYYY")
-                            parsed_date = datetime.strptime(date_text, '%b %d, %Y')
-                            sale_date = parsed_date
-                            print(f"Parsed sale date: {sale_date}")
-                        except ValueError as e:
-                            print(f"Could not parse date '{date_text}': {str(e)}")
-                print(f"Sale date: {sale_date}")
+                if verbose:
+                    logger.debug(f"Processing item: {title} (${price}, sold {sale_date}, {listing_url})")
 
                 # Skip items without a sale date
                 if not sale_date:
-                    print(f"Skipping item: No sale date found - {title}")
+                    logger.debug(f"Skipping item: No sale date found - {title}")
                     continue
 
-                # Get listing URL
-                link_elem = item.select_one('a.s-item__link')
-                listing_url = link_elem['href'] if link_elem else None
-                print(f"URL: {listing_url}")
-
                 # Skip items without a URL
                 if not listing_url:
-                    print(f"Skipping item: No URL found - {title}")
+                    logger.debug(f"Skipping item: No URL found - {title}")
                     continue
 
-                # Add to database
-                cursor.execute('''
-                    INSERT INTO card_prices 
-                    (card_name, title, price, sale_date, listing_url, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    'victor wembanyama prizm #136 silver prizm psa 10 rc',
-                    title,
-                    price,
-                    sale_date.strftime('%Y-%m-%d'),
-                    listing_url,
-                    datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-                ))
-                print(f"Added to database: {title}")
+                # Queue for the batched insert
+                writer.add(query.card_name, title, price, sale_date, listing_url)
 
             except Exception as e:
                 logger.error(f"Error processing item: {str(e)}")
-                print(f"Error processing item: {str(e)}")
                 continue
 
-        # Commit changes
-        conn.commit()
+        # Write everything in one transaction; known listings are skipped
+        writer.close()
         conn.close()
-        print(f"Finished processing sales data. Processed {len(items)} items.")
-        logger.info(f"Finished processing sales data. Processed {len(items)} items.")
+        logger.info(f"Finished processing sales data. Processed {len(items)} items, "
+                    f"{writer.inserted} new, {writer.duplicates} duplicates.")
 
     except Exception as e:
         logger.error(f"Error fetching eBay data: {str(e)}")
-        print(f"Error fetching eBay data: {str(e)}")
         raise
 
-def get_ebay_sales_multiple_pages(max_pages=5):
-    """Scrape multiple pages of eBay for Victor Wembanyama #136 Silver Prizm RC PSA 10 sales and store in a new table."""
-    print("Starting multi-page scraper...")
-    base_url = "https://www.ebay.com/sch/i.html?_nkw=victor+webanyama+prizm+%23136+silver+prizm+psa+10+rc&_sacat=0&_from=R40&_trksid=m570.l1313&_odkw=victor+webanyama+prizm+%23+136+silver+prizm+psa+10+rc&_osacat=0&LH_Complete=1&LH_Sold=1"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Cache-Control': 'max-age=0',
-        'DNT': '1'
-    }
+def get_ebay_sales_multiple_pages(max_pages=5, queries=None, engine=None, parser=None, incremental=True,
+                                  processes=None):
+    """Scrape multiple pages of eBay sold listings for every card query and store them.
+
+    Runs as a pipeline (see pipeline.py): queries are fetched concurrently by the scrape
+    engine, pages are parsed in `processes` worker processes, and one writer thread stores
+    them. Each query stops paginating as soon as it runs out of results. `parser` picks the
+    item extraction backend (see parsers.PARSERS). Failed requests are retried with backoff,
+    and every attempt counts against the shared daily call budget. With `incremental`, each
+    card also stops at the first page whose sales are all behind its stored high-water mark,
+    so steady-state runs fetch only a page or two per card.
+    """
+    logger.info("Starting multi-page scraper...")
+    own_engine = engine is None
+    engine = engine or ScrapeEngine(budget=DailyBudget(), cache=PageCache.from_env())
+
+    conn = storage.connect()
+    try:
+        # Stalest, most volatile cards go first in case the daily call budget runs out
+        queries = prioritize(conn, queries or [WEMBY_QUERY])
+        checkpoints = load_checkpoints(conn, [query.card_name for query in queries])
+    finally:
+        conn.close()
+    # Checkpoints stay frozen while workers consult them; the writer advances them at the end
+    should_continue = incremental_stop(checkpoints) if incremental else stop_on_empty_page
 
-    conn = sqlite3.connect('card_prices.db')
-    cursor = conn.cursor()
-    # Create the new table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS multiple_pages_wemby (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            card_name TEXT NOT NULL,
-            title TEXT NOT NULL,
-            price REAL NOT NULL,
-            sale_date TEXT,
-            listing_url TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
+    def on_page(query, page, items):
+        logger.info(f"Found {len(items)} items on page {page} for {query.card_name}")
 
-    for page in range(1, max_pages + 1):
-        url = f"{base_url}&_pgn={page}"
-        print(f"Scraping page {page}: {url}")
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            items = soup.select('li.s-item')
-            print(f"Found {len(items)} items on page {page}")
-            if not items:
-                print("No more items found, stopping.")
-                break
-            for item in items:
-                try:
-                    title_elem = item.select_one('div.s-item__title')
-                    if not title_elem:
-                        continue
-                    title = title_elem.text.strip()
-                    price_elem = item.select_one('span.s-item__price')
-                    if not price_elem:
-                        continue
-                    price_text = price_elem.text.strip()
-                    price = float(price_text.replace('$', '').replace(',', ''))
-                    date_elem = item.select_one('span.s-item__caption--signal')
-                    sale_date = None
-                    if date_elem:
-                        date_text = date_elem.text.strip()
-                        if 'Sold' in date_text:
-                            date_text = date_text.replace('Sold', '').strip()
-                            try:
-                                parsed_date = datetime.strptime(date_text, '%b %d, %Y')
-                                sale_date = parsed_date
-                            except ValueError as e:
-                                print(f"Could not parse date '{date_text}': {str(e)}")
-                    if not sale_date:
-                        continue
-                    link_elem = item.select_one('a.s-item__link')
-                    listing_url = link_elem['href'] if link_elem else None
-                    if not listing_url:
-                        continue
-                    cursor.execute('''
-                        INSERT INTO multiple_pages_wemby 
-                        (card_name, title, price, sale_date, listing_url, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        'victor wembanyama prizm #136 silver prizm psa 10 rc',
-                        title,
-                        price,
-                        sale_date.strftime('%Y-%m-%d'),
-                        listing_url,
-                        datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-                    ))
-                    print(f"Added to multiple_pages_wemby: {title}")
-                except Exception as e:
-                    logger.error(f"Error processing item: {str(e)}")
-                    print(f"Error processing item: {str(e)}")
-                    continue
-            conn.commit()
-            time.sleep(random.uniform(1, 3))
-        except Exception as e:
-            logger.error(f"Error fetching eBay data on page {page}: {str(e)}")
-            print(f"Error fetching eBay data on page {page}: {str(e)}")
-            break
-    conn.close()
-    print("Finished multi-page scraping.")
+    try:
+        pages_fetched, inserted, duplicates = run_pipeline(
+            engine, queries, checkpoints, parser=parser,
+            processes=processes, max_pages=max_pages, should_continue=should_continue, on_page=on_page)
+    finally:
+        logger.info(f"Scrape engine stats: {engine.stats()}")
+        if own_engine:
+            engine.close()
+    logger.info(f"Finished multi-page scraping: {pages_fetched} pages, {inserted} new, {duplicates} duplicates.")
 
 if __name__ == "__main__":
     get_ebay_sales() 
\ No newline at end of file
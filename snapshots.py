@@ -0,0 +1,276 @@
+"""Columnar snapshots of sales for analytics that should not touch the live database.
+
+Each export appends the sales added since the last one as Arrow IPC (or Parquet)
+files partitioned by card and sale month:
+
+    snapshots/card_id=12/month=2025-06/part-000007-0.arrow
+
+manifest.json records the highest sales.id exported and every file written,
+so the next run reads only newer rows and readers only see files whose export
+finished. Arrow files are uncompressed and memory-mapped on read, so scans are
+zero-copy views of the page cache rather than copies in the Python heap.
+
+Usage: python snapshots.py export [--format parquet] | compact | stats
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import storage
+from units import from_day
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for snapshots, not by the scraper or API
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+MANIFEST = 'manifest.json'
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+# Rows read from SQLite per batch, bounding the exporter's memory
+EXPORT_BATCH_ROWS = 50000
+# Partitions with more part files than this are merged by compact()
+COMPACT_MIN_PARTS = 4
+
+EXPORT_SQL = '''
+    SELECT s.id, s.card_id, c.name, s.title, s.price_cents, s.sale_day, s.listing_url, s.listing_id, s.scraped_at
+    FROM sales s
+    JOIN cards c ON c.id = s.card_id
+    WHERE s.id > ? AND s.sale_day IS NOT NULL
+    ORDER BY s.id
+    LIMIT ?
+'''
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Snapshots need pyarrow: pip install pyarrow")
+
+
+def schema():
+    _require_pyarrow()
+    return pa.schema([
+        ('id', pa.int64()),
+        ('card_id', pa.int64()),
+        ('card_name', pa.string()),
+        ('title', pa.string()),
+        ('price_cents', pa.int64()),
+        # date32 is days since the epoch, the same as sale_day, so it converts for free
+        ('sale_date', pa.date32()),
+        ('listing_url', pa.string()),
+        ('listing_id', pa.string()),
+        # Parquet has no second resolution, so both formats store milliseconds
+        ('scraped_at', pa.timestamp('ms')),
+    ])
+
+
+def load_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {'last_id': 0, 'runs': 0, 'cards': {}, 'files': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(root, manifest):
+    """Replace the manifest atomically; files it does not list are invisible to readers"""
+    path = os.path.join(root, MANIFEST)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def write_table(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.parquet'):
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_table(path, columns=None):
+    """Read one snapshot file through a memory map; Arrow files are not copied at all"""
+    if path.endswith('.parquet'):
+        return pq.ParquetFile(path, memory_map=True).read(columns=columns)
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(columns) if columns else table
+
+
+def partition_dir(card_id, month):
+    return os.path.join(f'card_id={card_id}', f'month={month}')
+
+
+# Arrow types of the raw SQLite values that need a cast into the schema's types
+SOURCE_TYPES = {'sale_date': 'int32', 'scraped_at': 'timestamp[s]'}
+
+
+def _to_table(rows):
+    fields = schema()
+    return pa.Table.from_arrays([
+        pa.array(values, type=SOURCE_TYPES.get(field.name)).cast(field.type)
+        for values, field in zip(zip(*rows), fields)
+    ], schema=fields)
+
+
+def export(conn=None, root=None, fmt='arrow'):
+    """Write every sale added since the last export; returns the number of rows exported"""
+    _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown snapshot format: {fmt}")
+    root = root or SNAPSHOT_DIR
+    own_conn = conn is None
+    conn = conn or storage.connect()
+    manifest = load_manifest(root)
+    run = manifest['runs'] + 1
+    last_id = manifest['last_id']
+    partitions = {}
+    try:
+        # Batches are grouped by partition in memory, then each partition gets one file per run
+        while True:
+            rows = conn.execute(EXPORT_SQL, (last_id, EXPORT_BATCH_ROWS)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                partitions.setdefault((row[1], from_day(row[5]).strftime('%Y-%m')), []).append(row)
+                manifest['cards'][str(row[1])] = row[2]
+            last_id = rows[-1][0]
+            if sum(len(part) for part in partitions.values()) >= EXPORT_BATCH_ROWS:
+                _write_partitions(root, manifest, partitions, run, fmt)
+                partitions = {}
+        _write_partitions(root, manifest, partitions, run, fmt)
+    finally:
+        if own_conn:
+            conn.close()
+    exported = last_id != manifest['last_id']
+    count = sum(f['rows'] for f in manifest['files'] if f['run'] == run)
+    if exported:
+        manifest['last_id'] = last_id
+        manifest['runs'] = run
+        save_manifest(root, manifest)
+    logger.info(f"Exported {count} sales to {root} (through id {manifest['last_id']})")
+    return count
+
+
+def _write_partitions(root, manifest, partitions, run, fmt):
+    for (card_id, month), rows in sorted(partitions.items()):
+        existing = sum(1 for f in manifest['files'] if f['run'] == run
+                       and f['card_id'] == card_id and f['month'] == month)
+        name = f"part-{run:06d}-{existing}{FORMATS[fmt]}"
+        path = os.path.join(partition_dir(card_id, month), name)
+        write_table(_to_table(rows), os.path.join(root, path))
+        manifest['files'].append({
+            'path': path, 'card_id': card_id, 'month': month, 'run': run,
+            'rows': len(rows), 'min_id': rows[0][0], 'max_id': rows[-1][0],
+        })
+
+
+def compact(root=None, min_parts=COMPACT_MIN_PARTS):
+    """Merge partitions that have accumulated many small per-run files into one"""
+    _require_pyarrow()
+    root = root or SNAPSHOT_DIR
+    manifest = load_manifest(root)
+    by_partition = {}
+    for entry in manifest['files']:
+        by_partition.setdefault((entry['card_id'], entry['month']), []).append(entry)
+    merged = 0
+    obsolete = []
+    for (card_id, month), entries in by_partition.items():
+        if len(entries) < min_parts:
+            continue
+        table = pa.concat_tables(read_table(os.path.join(root, e['path'])) for e in entries)
+        suffix = FORMATS['parquet'] if entries[-1]['path'].endswith('.parquet') else FORMATS['arrow']
+        path = os.path.join(partition_dir(card_id, month), f"compact-{manifest['runs']:06d}{suffix}")
+        write_table(table.sort_by('id'), os.path.join(root, path))
+        manifest['files'] = [f for f in manifest['files'] if f not in entries]
+        manifest['files'].append({
+            'path': path, 'card_id': card_id, 'month': month, 'run': manifest['runs'],
+            'rows': table.num_rows, 'min_id': min(e['min_id'] for e in entries),
+            'max_id': max(e['max_id'] for e in entries),
+        })
+        obsolete.extend(e['path'] for e in entries)
+        merged += 1
+    if merged:
+        save_manifest(root, manifest)
+        # Old parts go only after the manifest stops pointing at them
+        for path in obsolete:
+            os.remove(os.path.join(root, path))
+    logger.info(f"Compacted {merged} partitions")
+    return merged
+
+
+class SnapshotReader:
+    """Read-only view over exported snapshots, filtered by card and month via the manifest.
+
+        reader = SnapshotReader()
+        sales = reader.table(cards=['victor_wembanyama'], months=('2025-01', '2025-06'))
+        df = sales.to_pandas()
+    """
+
+    def __init__(self, root=None):
+        _require_pyarrow()
+        self.root = root or SNAPSHOT_DIR
+        self.manifest = load_manifest(self.root)
+
+    def card_ids(self, names):
+        wanted = set(names)
+        return {int(card_id) for card_id, name in self.manifest['cards'].items() if name in wanted}
+
+    def files(self, cards=None, months=None):
+        """Paths of the files holding the given cards (by name) and inclusive (first, last) month range"""
+        card_ids = self.card_ids(cards) if cards is not None else None
+        paths = []
+        for entry in self.manifest['files']:
+            if card_ids is not None and entry['card_id'] not in card_ids:
+                continue
+            if months and not months[0] <= entry['month'] <= months[1]:
+                continue
+            paths.append(os.path.join(self.root, entry['path']))
+        return paths
+
+    def table(self, cards=None, months=None, columns=None):
+        """One Arrow table over the matching files; chunks stay backed by their memory maps"""
+        tables = [read_table(path, columns) for path in self.files(cards, months)]
+        if not tables:
+            fields = schema() if columns is None else pa.schema([schema().field(c) for c in columns])
+            return fields.empty_table()
+        return pa.concat_tables(tables)
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'last_id': self.manifest['last_id'],
+            'runs': self.manifest['runs'],
+            'cards': len(self.manifest['cards']),
+            'files': len(self.manifest['files']),
+            'rows': sum(entry['rows'] for entry in self.manifest['files']),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export sales to columnar snapshots")
+    parser.add_argument('command', choices=['export', 'compact', 'stats'])
+    parser.add_argument('--dir', default=None, help='snapshot directory (default: $SNAPSHOT_DIR or snapshots)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='arrow',
+                        help='arrow (memory-mappable) or parquet (compressed)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'export':
+        export(root=args.dir, fmt=args.format)
+    elif args.command == 'compact':
+        compact(root=args.dir)
+    for name, value in SnapshotReader(args.dir).stats().items():
+        print(f"{name}: {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
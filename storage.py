@@ -0,0 +1,279 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+import classifier
+import db
+import fair_value
+import metrics
+import rollups
+from listing_ids import normalize_listing_id
+from migrations import migrate
+from units import to_cents, to_day
+
+logger = logging.getLogger(__name__)
+
+# Listing IDs are remembered for sales this many days behind the high-water mark,
+# since eBay can surface a sale a little after newer ones have already appeared
+CHECKPOINT_WINDOW_DAYS = 3
+
+INSERT_SALE_SQL = '''
+    INSERT INTO sales (card_id, sale_day, price_cents, scraped_at, listing_id, title, listing_url,
+                       grade, parallel, is_lot, match_confidence)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(listing_id) DO NOTHING
+'''
+
+
+def ensure_schema(conn):
+    """Bring a connection's database up to the current schema"""
+    migrate(conn)
+    ensure_checkpoint_table(conn)
+
+
+def connect(path=None, row_factory=None, check_same_thread=True):
+    """Open the card database with the current schema; scripts should connect through this"""
+    conn = db.connect(path, row_factory, check_same_thread)
+    ensure_schema(conn)
+    return conn
+
+
+def reset_database(conn):
+    """Drop every table, view and trigger and rebuild the schema from scratch"""
+    objects = conn.execute('''
+        SELECT type, name FROM sqlite_master
+        WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'cards_fts_%'
+    ''').fetchall()
+    with conn:
+        for kind, name in objects:
+            conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+        conn.execute("PRAGMA user_version = 0")
+    ensure_schema(conn)
+
+
+def get_card_id(conn, card_name):
+    """Return a card's integer ID, registering the card if it is new"""
+    conn.execute("INSERT OR IGNORE INTO cards (name) VALUES (?)", (card_name,))
+    return conn.execute("SELECT id FROM cards WHERE name = ?", (card_name,)).fetchone()[0]
+
+
+class SalesWriter:
+    """Buffers parsed sales and writes them in batched transactions, skipping known listings.
+
+    Use as a context manager so the tail of the buffer is flushed and outlier bounds are
+    refreshed on exit:
+
+        with SalesWriter(conn) as writer:
+            writer.add(card_name, title, price, sale_date, listing_url)
+        print(writer.inserted, writer.duplicates)
+
+    Outlier bounds are recomputed from a card's whole history, so they are refreshed once
+    per changed card in close() rather than on every flush.
+    """
+
+    def __init__(self, conn, batch_size=500):
+        migrate(conn)
+        self.conn = conn
+        self.batch_size = batch_size
+        self.buffer = []
+        self.inserted = 0
+        self.duplicates = 0
+        self.card_ids = {}
+        # IDs of cards that received new rows over the writer's lifetime
+        self.changed_cards = set()
+        # Changed cards whose outlier bounds close() has yet to refresh
+        self.stale_bounds = set()
+
+    def add(self, card_name, title, price, sale_date, listing_url):
+        """Queue one sale; flushes automatically once the batch is full"""
+        self.buffer.append((
+            card_name,
+            to_day(sale_date),
+            to_cents(price),
+            int(time.time()),
+            normalize_listing_id(listing_url),
+            title,
+            listing_url
+        ))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffer in one transaction and return (inserted, duplicates) for it"""
+        if not self.buffer:
+            return 0, 0
+        rows, self.buffer = self.buffer, []
+        try:
+            with metrics.timer('sales_insert_seconds'), self.conn:
+                inserted = self._insert_by_card(rows)
+        except Exception:
+            # Card IDs registered in the rolled-back transaction no longer exist
+            self.card_ids.clear()
+            raise
+        duplicates = len(rows) - inserted
+        self.inserted += inserted
+        self.duplicates += duplicates
+        metrics.inc('sales_inserted_total', inserted)
+        metrics.inc('sales_duplicates_total', duplicates)
+        logger.info(f"Flushed {len(rows)} sales: {inserted} new, {duplicates} duplicates")
+        return inserted, duplicates
+
+    def refresh_bounds(self):
+        """Recompute outlier bounds for every card changed since the last refresh, in one transaction"""
+        if not self.stale_bounds:
+            return
+        # outliers needs numpy, which processes that only read (the API) should not load at startup
+        import outliers
+        card_ids = sorted(self.stale_bounds)
+        with metrics.timer('outlier_refresh_seconds'), self.conn:
+            for card_id in card_ids:
+                outliers.refresh_bounds(self.conn, card_id)
+            # Filtered responses cached since the rows landed were built on the old bounds
+            self.conn.executemany("UPDATE cards SET data_version = data_version + 1 WHERE id = ?",
+                                  [(card_id,) for card_id in card_ids])
+        self.stale_bounds.clear()
+        logger.info(f"Refreshed outlier bounds for {len(card_ids)} cards")
+
+    def close(self):
+        """Flush what is buffered and refresh the changed cards' outlier bounds"""
+        self.flush()
+        self.refresh_bounds()
+
+    def _insert_by_card(self, rows):
+        """Insert rows card by card; cards that gained sales get a new data_version, rollups and
+        fair-value model, and are marked for an outlier bounds refresh"""
+        # Everything this batch stores gets a rowid above this
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+        by_card = {}
+        for card_name, *sale in rows:
+            by_card.setdefault(card_name, []).append(sale)
+        inserted = 0
+        for card_name, sales in by_card.items():
+            card_id = self._card_id(card_name)
+            # A batch's titles are classified together, each distinct title once
+            results = classifier.classify_titles(card_name, [sale[4] for sale in sales])
+            count = self.conn.executemany(
+                INSERT_SALE_SQL, [[card_id, *sale, *result] for sale, result in zip(sales, results)]).rowcount
+            if count:
+                # Readers key caches on this, so it must change in the same transaction as the rows
+                self.conn.execute("UPDATE cards SET data_version = data_version + 1 WHERE id = ?", (card_id,))
+                rollups.refresh_buckets(self.conn, card_id, [sale[0] for sale in sales])
+                fair_value.apply_new_sales(self.conn, card_id, last_id)
+                self.changed_cards.add(card_id)
+                self.stale_bounds.add(card_id)
+            inserted += count
+        return inserted
+
+    def _card_id(self, card_name):
+        """Look up (or register) a card's integer ID, caching it for the writer's lifetime"""
+        card_id = self.card_ids.get(card_name)
+        if card_id is None:
+            card_id = self.card_ids[card_name] = get_card_id(self.conn, card_name)
+        return card_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def ensure_checkpoint_table(conn):
+    """Create the per-card scrape checkpoint table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            card_name TEXT PRIMARY KEY,
+            newest_sale_date TEXT,
+            recent_listing_ids TEXT NOT NULL DEFAULT '{}',
+            last_scraped_at TEXT
+        )
+    ''')
+    conn.commit()
+
+
+class Checkpoint:
+    """High-water mark for one card: the newest sale date seen and the listing IDs near it.
+
+    Results are requested newest-first, so once a page holds nothing newer than the mark
+    and no listing we haven't seen, every later page is already stored too.
+    """
+
+    def __init__(self, card_name, newest_sale_date=None, recent_sales=None, last_scraped_at=None):
+        self.card_name = card_name
+        self.newest_sale_date = newest_sale_date
+        # listing_id -> sale_date for sales inside the window behind the mark
+        self.recent_sales = dict(recent_sales or {})
+        self.last_scraped_at = last_scraped_at
+
+    def is_known(self, listing_id, sale_date):
+        """True if this sale is already covered by the checkpoint"""
+        if self.newest_sale_date is None:
+            return False
+        if listing_id in self.recent_sales:
+            return True
+        return sale_date < self._window_start()
+
+    def page_is_known(self, items):
+        """True if every dated item on a parsed page is already covered"""
+        if self.newest_sale_date is None:
+            return False
+        for title, price, sale_date, listing_url in items:
+            if not sale_date or not listing_url:
+                continue
+            if not self.is_known(normalize_listing_id(listing_url), sale_date.strftime('%Y-%m-%d')):
+                return False
+        return True
+
+    def _window_start(self):
+        newest = datetime.strptime(self.newest_sale_date, '%Y-%m-%d')
+        return (newest - timedelta(days=CHECKPOINT_WINDOW_DAYS)).strftime('%Y-%m-%d')
+
+    def advance(self, sales):
+        """Move the mark forward over (listing_id, sale_date) pairs from a card whose pagination finished"""
+        for listing_id, sale_date in sales:
+            self.recent_sales[listing_id] = sale_date
+            if self.newest_sale_date is None or sale_date > self.newest_sale_date:
+                self.newest_sale_date = sale_date
+        if self.newest_sale_date is not None:
+            window_start = self._window_start()
+            self.recent_sales = {
+                listing_id: sale_date for listing_id, sale_date in self.recent_sales.items()
+                if sale_date >= window_start
+            }
+
+    def mark_scraped(self):
+        """Record that the card's pages were fetched just now"""
+        self.last_scraped_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+    def save(self, conn):
+        conn.execute('''
+            INSERT INTO scrape_checkpoints (card_name, newest_sale_date, recent_listing_ids, last_scraped_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(card_name) DO UPDATE SET
+                newest_sale_date = excluded.newest_sale_date,
+                recent_listing_ids = excluded.recent_listing_ids,
+                last_scraped_at = excluded.last_scraped_at
+        ''', (self.card_name, self.newest_sale_date,
+              json.dumps(self.recent_sales, sort_keys=True), self.last_scraped_at))
+
+
+def load_checkpoints(conn, card_names):
+    """Load checkpoints for the given cards; cards never scraped get an empty one"""
+    ensure_checkpoint_table(conn)
+    checkpoints = {name: Checkpoint(name) for name in card_names}
+    cursor = conn.execute('''
+        SELECT card_name, newest_sale_date, recent_listing_ids, last_scraped_at
+        FROM scrape_checkpoints
+    ''')
+    for card_name, newest_sale_date, recent_listing_ids, last_scraped_at in cursor:
+        if card_name in checkpoints:
+            checkpoints[card_name] = Checkpoint(card_name, newest_sale_date,
+                                                json.loads(recent_listing_ids), last_scraped_at)
+    return checkpoints
+
+
+def save_checkpoints(conn, checkpoints):
+    with conn:
+        for checkpoint in checkpoints:
+            checkpoint.save(conn)
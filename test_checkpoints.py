@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import storage
+from pipeline import incremental_stop, run_pipeline
+from scrape_engine import CardQuery, ScrapeEngine
+from storage import load_checkpoints
+
+QUERY = CardQuery('test card', 'test card')
+PAGES = 3
+ITEMS_PER_PAGE = 20
+
+
+class FakeEngine(ScrapeEngine):
+    """Serves numbered result pages newest-first, failing any page listed in `failing`"""
+
+    def __init__(self, failing=()):
+        super().__init__(max_workers=1)
+        self.failing = set(failing)
+        self.fetched = []
+
+    def fetch(self, url):
+        page = int(parse_qs(urlsplit(url).query)['_pgn'][0])
+        self.fetched.append(page)
+        if page in self.failing:
+            raise RuntimeError(f"HTTP 500 on page {page}")
+        return page
+
+
+def parse(page):
+    if page > PAGES:
+        return []
+    newest = datetime(2024, 6, 30)
+    items = []
+    for i in range(ITEMS_PER_PAGE):
+        n = (page - 1) * ITEMS_PER_PAGE + i
+        items.append((f'test card {n}', 10.0 + n, newest - timedelta(days=n),
+                      f'https://www.ebay.com/itm/{100000 + n}'))
+    return items
+
+
+def scrape(conn, engine):
+    checkpoints = load_checkpoints(conn, [QUERY.card_name])
+    try:
+        run_pipeline(engine, [QUERY], checkpoints, max_pages=PAGES + 1,
+                     should_continue=incremental_stop(checkpoints), parse=parse, conn=conn)
+    finally:
+        engine.close()
+    return load_checkpoints(conn, [QUERY.card_name])[QUERY.card_name]
+
+
+def stored_sales(conn):
+    return conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+
+
+def test_failed_middle_page_is_fetched_next_run(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'), check_same_thread=False)
+
+    checkpoint = scrape(conn, FakeEngine(failing={2}))
+    assert stored_sales(conn) == ITEMS_PER_PAGE
+    # Cut short, so the mark stays put; page 1 was fetched, so the card counts as scraped
+    assert checkpoint.newest_sale_date is None
+    assert checkpoint.last_scraped_at is not None
+
+    engine = FakeEngine()
+    checkpoint = scrape(conn, engine)
+    assert engine.fetched == [1, 2, 3, 4]
+    assert stored_sales(conn) == PAGES * ITEMS_PER_PAGE
+    assert checkpoint.newest_sale_date == '2024-06-30'
+
+    # Finished cleanly, so the next run stops at the first known page
+    engine = FakeEngine()
+    scrape(conn, engine)
+    assert engine.fetched == [1]
+    conn.close()
+
+
+def test_card_failing_first_page_is_not_marked_scraped(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'), check_same_thread=False)
+    checkpoint = scrape(conn, FakeEngine(failing={1}))
+    assert stored_sales(conn) == 0
+    assert checkpoint.last_scraped_at is None
+    conn.close()
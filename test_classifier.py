@@ -0,0 +1,79 @@
+import pytest
+
+import storage
+from classifier import MATCH_THRESHOLD, card_rules, classify
+
+CARD = 'victor wembanyama prizm #136 silver prizm psa 10 rc'
+RULES = card_rules(CARD)
+# The title a listing of exactly this card would have
+EXACT = '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC'
+# Missing only the card number (weight 20) scores exactly the threshold
+AT_THRESHOLD = '2023 Panini Prizm Victor Wembanyama Silver PSA 10 RC'
+# Missing only the grade (weight 25), e.g. a raw card, falls just under it
+BELOW_THRESHOLD = '2023 Panini Prizm Victor Wembanyama #136 Silver RC'
+
+
+@pytest.mark.parametrize('title, grade, parallel', [
+    ('2023 Panini Prizm Victor Wembanyama #136 Silver PSA 9 RC', 'psa 9', 'silver'),
+    ('2023 Panini Prizm Victor Wembanyama #136 Silver BGS 9.5', 'bgs 9.5', 'silver'),
+    ('2023 Panini Prizm Victor Wembanyama #137 Silver PSA 10 RC', 'psa 10', 'silver'),
+    ('2023 Panini Prizm Victor Wembanyama #136 Gold PSA 10 RC', 'psa 10', 'gold'),
+    ('2023 Panini Prizm Victor Wembanyama #136 Base PSA 10 RC', 'psa 10', None),
+])
+def test_contradictions_score_zero(title, grade, parallel):
+    assert classify(RULES, title) == (grade, parallel, 0, 0)
+
+
+@pytest.mark.parametrize('title', [
+    'Lot of 3 2023 Prizm Victor Wembanyama #136 Silver PSA 10',
+    '2023 Prizm Victor Wembanyama #136 Silver PSA 10 x3',
+    '2023 Prizm Victor Wembanyama #136 Silver PSA 10 Bundle',
+])
+def test_lots_score_zero(title):
+    result = classify(RULES, title)
+    assert (result.is_lot, result.confidence) == (1, 0)
+
+
+@pytest.mark.parametrize('title, confidence', [
+    (EXACT, 100),
+    # Spellings, aliases and grade formats eBay sellers use for the same card
+    ('2023 Panini Prizm Victor Wembenyama #136 Holo PSA GEM MT 10', 100),
+    ('2023 Panini Prizm Victor Wembanyama No. 136 Silver PSA-10 RC', 100),
+    ('2023 Panini Prizm Victor Wembanyama #136 PSA 10 RC', 85),
+    (AT_THRESHOLD, 80),
+    (BELOW_THRESHOLD, 75),
+    ('Victor Wembanyama PSA 10', 52),
+])
+def test_partial_matches_score_the_rules_they_confirm(title, confidence):
+    assert classify(RULES, title).confidence == confidence
+
+
+@pytest.mark.parametrize('title, confidence', [
+    ('Jalen Green Prizm #1 PSA 10', 100),
+    ('Jalen Green Prizm #1 Base PSA 10', 100),
+    ('Jalen Green Prizm #1 Silver PSA 10', 0),
+])
+def test_parallel_words_in_player_names(title, confidence):
+    # 'green' is the player here, and the card is named as the base version
+    assert classify(card_rules('jalen green prizm #1 base psa 10'), title).confidence == confidence
+
+
+def test_partial_index_uses_the_threshold(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'))
+    index_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'idx_sales_card_day_matched'").fetchone()[0]
+    # The index is spelled with the literal, so the two must move together
+    assert MATCH_THRESHOLD == 80
+    assert index_sql.split()[-4:] == ['WHERE', 'match_confidence', '>=', str(MATCH_THRESHOLD)]
+
+    with storage.SalesWriter(conn) as writer:
+        for n, title in enumerate([EXACT, AT_THRESHOLD, BELOW_THRESHOLD]):
+            writer.add(CARD, title, 500, '2024-06-01', f'https://www.ebay.com/itm/{400000000000 + n}')
+    matched = conn.execute(f'''
+        SELECT title, match_confidence
+        FROM sales INDEXED BY idx_sales_card_day_matched
+        WHERE match_confidence >= {MATCH_THRESHOLD}
+        ORDER BY id
+        ''').fetchall()
+    assert matched == [(EXACT, 100), (AT_THRESHOLD, 80)]
+    conn.close()
@@ -0,0 +1,24 @@
+import pytest
+
+from daemon import ScrapeDaemon
+
+
+def bare_daemon(path, mtime):
+    """A daemon with only the state load() reads before the file changes"""
+    daemon = ScrapeDaemon.__new__(ScrapeDaemon)
+    daemon.watchlist_path = str(path)
+    daemon.watchlist_mtime = mtime
+    daemon.entries = {'kept card': object()}
+    return daemon
+
+
+def test_missing_watchlist_keeps_the_previous_one(tmp_path):
+    daemon = bare_daemon(tmp_path / 'gone.toml', mtime=1.0)
+    daemon.load()
+    assert list(daemon.entries) == ['kept card']
+    assert daemon.watchlist_mtime == 1.0
+
+
+def test_missing_watchlist_at_startup_raises(tmp_path):
+    with pytest.raises(OSError):
+        bare_daemon(tmp_path / 'gone.toml', mtime=None).load()
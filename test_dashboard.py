@@ -0,0 +1,55 @@
+import gzip
+import re
+from urllib.parse import quote
+
+import pytest
+
+import storage
+from app import app
+from db import pool
+
+SALES = 60
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / 'cards.db')
+    conn = storage.connect(path)
+    with storage.SalesWriter(conn) as writer:
+        for n in range(SALES):
+            writer.add('victor wembanyama prizm #136 silver prizm psa 10 rc',
+                       '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC', 500 + n % 10,
+                       f'2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}', f'https://www.ebay.com/itm/{200000000000 + n}')
+    conn.close()
+    pool.close_all()
+    pool.path = path
+    yield app.test_client()
+    pool.close_all()
+    pool.path = None
+
+
+def test_page_default_selection_has_data(client):
+    page = client.get('/').get_data(as_text=True)
+    # The dropdown is filled from /api/cards, not hard-coded names
+    assert "fetch('/api/cards')" in page
+    assert not re.search(r'<option value="[^"]+"', page)
+
+    default = client.get('/api/cards').get_json()[0]
+    data = client.get('/api/dashboard', query_string={'cards': default, 'encoding': 'delta',
+                                                      'history': 'no-outliers'}).get_json()
+    assert data['missing'] == []
+    card = data['cards'][default]
+    assert len(card['latest']) == 6
+    assert len(card['history']) == SALES
+
+
+def test_cached_chart_keeps_its_encoding(client):
+    name = quote(client.get('/api/cards').get_json()[0])
+    for _ in range(2):
+        # The first request renders and caches the body, the second is served from the cache
+        response = client.get(f'/api/price-history/{name}', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(gzip.decompress(response.data).decode().split(',')) > SALES
+        response = client.get(f'/api/price-history/{name}', headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json()['encoding'] == 'plain'
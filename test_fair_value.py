@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+
+import pytest
+
+import fair_value
+import storage
+
+CARD = 'victor wembanyama prizm #136 silver prizm psa 10 rc'
+TITLE = '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC'
+NEWEST = date(2024, 6, 30)
+
+
+def sale(n):
+    """The n-th newest sale: one every other day, prices drifting up over time with some noise"""
+    return (CARD, TITLE, 400 + (200 - n) + (n * 37) % 50, (NEWEST - timedelta(days=2 * n)).isoformat(),
+            f'https://www.ebay.com/itm/{500000000000 + n}')
+
+
+def models(conn):
+    return conn.execute("SELECT card_id, level, scale, weight, sale_count, last_day FROM fair_value_models").fetchall()
+
+
+def assert_matches_rebuild(conn):
+    incremental = models(conn)
+    fair_value.rebuild(conn)
+    rebuilt = models(conn)
+    assert len(incremental) == len(rebuilt) == 1
+    for got, expected in zip(incremental[0], rebuilt[0]):
+        assert got == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'))
+    yield conn
+    conn.close()
+
+
+def test_newest_first_backfill_matches_rebuild(conn):
+    # A first scrape walks result pages newest-first, so each flush holds older sales than the last
+    with storage.SalesWriter(conn, batch_size=20) as writer:
+        for n in range(100):
+            writer.add(*sale(n))
+    assert_matches_rebuild(conn)
+
+
+def test_later_scrapes_match_rebuild(conn):
+    with storage.SalesWriter(conn, batch_size=20) as writer:
+        for n in range(40, 100):
+            writer.add(*sale(n))
+    # Newer sales fold straight on; a sale eBay surfaced late lands behind the newest one
+    with storage.SalesWriter(conn) as writer:
+        for n in range(10, 40):
+            writer.add(*sale(n))
+    with storage.SalesWriter(conn) as writer:
+        writer.add(*sale(0))
+        writer.add(*sale(5))
+    assert conn.execute("SELECT sale_count FROM fair_value_models").fetchone()[0] == 92
+    assert_matches_rebuild(conn)
@@ -0,0 +1,31 @@
+import numpy as np
+
+import outliers
+import storage
+from units import to_day
+
+
+def test_months_without_nearby_sales_get_no_rolling_bounds():
+    days = np.array([to_day('2023-01-05'), to_day('2023-09-05')])
+    rows = outliers.compute_bounds(days, np.array([10.0, 12.0]))
+    rolling = [start for method, start, end, lower, upper in rows if method == 'rolling_iqr']
+    # Windows reach 45 days either side: January and February see the first sale, July to
+    # September the second, and March to June neither
+    assert rolling == [to_day(f'2023-{month:02d}-01') for month in (1, 2, 7, 8, 9)]
+
+
+def test_sparse_history_refreshes_and_rebuilds(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'))
+    with storage.SalesWriter(conn) as writer:
+        writer.add('sparse card', 'sparse card', 10, '2023-01-05', 'https://www.ebay.com/itm/111111111111')
+        writer.add('sparse card', 'sparse card', 12, '2023-09-05', 'https://www.ebay.com/itm/211111111111')
+    with conn:
+        outliers.rebuild(conn)
+    # Every sale still falls in a stored period, so no-outlier filtering keeps both
+    kept = conn.execute('''
+        SELECT COUNT(*) FROM sales s
+        JOIN outlier_bounds b ON b.card_id = s.card_id AND b.method = 'rolling_iqr'
+         AND s.sale_day BETWEEN b.period_start AND b.period_end
+    ''').fetchone()[0]
+    assert kept == 2
+    conn.close()
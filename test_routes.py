@@ -0,0 +1,83 @@
+from urllib.parse import quote
+
+import pytest
+
+import storage
+from app import app
+from db import pool
+
+CARD = 'victor wembanyama prizm #136 silver prizm psa 10 rc'
+TITLE = '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC'
+# Few days, many sales each, so most page boundaries fall inside a day
+DAYS = ['2024-06-01', '2024-06-02', '2024-06-03']
+SALES = 25
+ROUTES = ['/api/latest-prices', '/api/sales-history', '/api/sales-history-no-outliers']
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / 'cards.db')
+    conn = storage.connect(path)
+    with storage.SalesWriter(conn) as writer:
+        for n in range(SALES):
+            writer.add(CARD, TITLE, 500 + n % 3, DAYS[n % len(DAYS)], f'https://www.ebay.com/itm/{300000000000 + n}')
+    conn.close()
+    pool.close_all()
+    pool.path = path
+    yield app.test_client()
+    pool.close_all()
+    pool.path = None
+
+
+def walk(client, route, limit):
+    """Every page of a route, following next_cursor until it runs out"""
+    pages = []
+    query = {'limit': limit}
+    while True:
+        response = client.get(f'{route}/{quote(CARD)}', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        pages.append(page)
+        if page['next_cursor'] is None:
+            return pages
+        query = {'limit': limit, 'cursor': page['next_cursor']}
+
+
+@pytest.mark.parametrize('route', ROUTES)
+@pytest.mark.parametrize('limit', [1, 4, 7])
+def test_cursor_pages_cover_every_sale_once(client, route, limit):
+    everything = client.get(f'{route}/{quote(CARD)}', query_string={'limit': 1000}).get_json()
+    assert everything['next_cursor'] is None
+    expected = [sale['listing_url'] for sale in everything['sales']]
+    assert len(expected) == SALES
+    dates = [sale['sale_date'] for sale in everything['sales']]
+    assert dates == sorted(dates, reverse=True)
+
+    pages = walk(client, route, limit)
+    urls = [sale['listing_url'] for page in pages for sale in page['sales']]
+    # No sale repeated or skipped where a page boundary splits a day
+    assert urls == expected
+    assert len(pages) == -(-SALES // limit)
+    assert all(len(page['sales']) == limit for page in pages[:-1])
+
+
+def test_last_page_has_no_cursor(client):
+    # A page that ends exactly on the last sale says so, rather than pointing at an empty page
+    page = client.get(f'/api/sales-history/{quote(CARD)}', query_string={'limit': SALES}).get_json()
+    assert len(page['sales']) == SALES
+    assert page['next_cursor'] is None
+
+    page = client.get(f'/api/sales-history/{quote(CARD)}', query_string={'limit': SALES - 1}).get_json()
+    last = client.get(f'/api/sales-history/{quote(CARD)}',
+                      query_string={'limit': SALES - 1, 'cursor': page['next_cursor']}).get_json()
+    assert len(last['sales']) == 1
+    assert last['next_cursor'] is None
+
+
+@pytest.mark.parametrize('route', ROUTES)
+@pytest.mark.parametrize('cursor', ['garbage', 'bm90IGpzb24=', 'WyJhIiwgMV0=', 'WzFd'])
+def test_malformed_cursor_is_rejected(client, route, cursor):
+    # Not base64, not JSON, a non-integer day, and a one-element list
+    response = client.get(f'{route}/{quote(CARD)}', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert 'Malformed cursor' in response.get_json()['error']
@@ -0,0 +1,64 @@
+import pytest
+
+import storage
+from listing_ids import normalize_listing_id
+
+CARD = 'victor wembanyama prizm #136 silver prizm psa 10 rc'
+TITLE = '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC'
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.ebay.com/itm/123456789012', '123456789012'),
+    ('https://www.ebay.com/itm/123456789012?hash=item1c&_trkparms=abc', '123456789012'),
+    ('https://www.ebay.com/itm/victor-wembanyama-prizm/123456789012#sold', '123456789012'),
+    ('http://ebay.com/itm/123456789012/', '123456789012'),
+    ('https://www.ebay.com/sch/i.html?item=123456789012&_nkw=wemby', '123456789012'),
+    ('https://Example.com/Listing/42/', 'example.com/listing/42'),
+    ('', None),
+])
+def test_normalize_listing_id(url, expected):
+    assert normalize_listing_id(url) == expected
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'))
+    yield conn
+    conn.close()
+
+
+def test_url_variants_of_one_item_are_stored_once(conn):
+    with storage.SalesWriter(conn) as writer:
+        writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012')
+        writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012?_trkparms=abc')
+        writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/wemby-prizm/123456789012')
+        writer.add(CARD, TITLE, 510, '2024-06-02', 'https://www.ebay.com/itm/223456789012')
+    assert (writer.inserted, writer.duplicates) == (2, 2)
+    rows = conn.execute("SELECT listing_id, listing_url FROM sales ORDER BY id").fetchall()
+    # The first URL seen for an item is the one kept
+    assert rows == [('123456789012', 'https://www.ebay.com/itm/123456789012'),
+                    ('223456789012', 'https://www.ebay.com/itm/223456789012')]
+
+
+def test_rows_already_stored_hit_on_conflict(conn):
+    with storage.SalesWriter(conn) as writer:
+        writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012')
+    version = conn.execute("SELECT data_version FROM cards WHERE name = ?", (CARD,)).fetchone()[0]
+
+    # A later run, in a new writer and transaction, sees the same sale again
+    with storage.SalesWriter(conn) as writer:
+        writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012?hash=x')
+    assert (writer.inserted, writer.duplicates) == (0, 1)
+    assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 1
+    # Nothing new, so cached responses for the card stay valid
+    assert conn.execute("SELECT data_version FROM cards WHERE name = ?", (CARD,)).fetchone()[0] == version
+
+
+def test_flush_reports_each_batch(conn):
+    writer = storage.SalesWriter(conn, batch_size=2)
+    writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012')
+    writer.add(CARD, TITLE, 500, '2024-06-01', 'https://www.ebay.com/itm/123456789012')
+    # The full batch flushed on add; one new row, one duplicate
+    assert (writer.inserted, writer.duplicates) == (1, 1)
+    assert writer.flush() == (0, 0)
+    writer.close()
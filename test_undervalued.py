@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+import storage
+import undervalued
+
+CARD = 'victor wembanyama prizm #136 silver prizm psa 10 rc'
+TITLE = '2023 Panini Prizm Victor Wembanyama #136 Silver PSA 10 RC'
+
+
+def test_only_listings_matching_the_card_are_scored(tmp_path):
+    conn = storage.connect(str(tmp_path / 'cards.db'))
+    with storage.SalesWriter(conn) as writer:
+        for n in range(10):
+            writer.add(CARD, TITLE, 500, (date.today() - timedelta(days=n)).isoformat(),
+                       f'https://www.ebay.com/itm/{300000000000 + n}')
+    # All far below the $500 fair value, but only the first is this card
+    undervalued.store_active_listings(conn, CARD, [
+        (TITLE, 300.0, None, 'https://www.ebay.com/itm/400000000001'),
+        (f'{TITLE} lot of 3', 100.0, None, 'https://www.ebay.com/itm/400000000002'),
+        (TITLE.replace('PSA 10', 'PSA 9'), 150.0, None, 'https://www.ebay.com/itm/400000000003'),
+        (TITLE.replace('Silver', 'Gold'), 200.0, None, 'https://www.ebay.com/itm/400000000004'),
+    ])
+    deals = undervalued.score_listings(conn)
+    assert [deal['title'] for deal in deals] == [TITLE]
+    assert deals[0]['fair_value'] == 500.0
+    conn.close()
@@ -0,0 +1,178 @@
+"""Find active eBay listings priced below their card's fair value.
+
+Fair value is the card's model in fair_value_models (see fair_value.py), the same
+estimate /api/fair-value serves: a time-decayed, outlier-robust level over sales
+whose titles matched the card. Active listings are classified the same way when
+stored, and only those matching their card are scored, so lots and other grades or
+parallels never pass for deals. Scoring is vectorized across all listings at
+once, so its cost grows with array length rather than with Python loops per listing.
+
+Usage: python undervalued.py [--scrape] [--watchlist watchlist.toml] [--min-discount 0.2] [--limit 25]
+"""
+import argparse
+import logging
+import math
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+import classifier
+from listing_ids import normalize_listing_id
+from parsers import get_parser
+from scrape_engine import CardQuery, ScrapeEngine
+import storage
+from storage import get_card_id
+from units import to_day
+from watchlist import WATCHLIST_PATH, load_watchlist
+
+logger = logging.getLogger(__name__)
+
+# Cards whose newest modelled sale is older than this get no fair value
+COMP_WINDOW_DAYS = 365
+# Cards modelled from fewer matched sales than this get no fair value
+MIN_COMPS = 5
+# Listings not seen by a scrape this recently are assumed to have ended
+ACTIVE_MAX_AGE_DAYS = 2
+
+MODELS_SQL = '''
+    SELECT card_id, level, sale_count
+    FROM fair_value_models
+    WHERE card_id IN (SELECT DISTINCT card_id FROM active_listings)
+      AND sale_count >= ? AND last_day >= ?
+'''
+
+ACTIVE_SQL = f'''
+    SELECT a.listing_id, a.card_id, c.name, a.title, a.price, a.listing_url, a.last_seen
+    FROM active_listings a
+    JOIN cards c ON c.id = a.card_id
+    WHERE a.last_seen >= datetime(?, ?)
+      AND a.match_confidence >= {classifier.MATCH_THRESHOLD}
+      AND (? IS NULL OR c.name = ?)
+'''
+
+UPSERT_ACTIVE_SQL = '''
+    INSERT INTO active_listings (listing_id, card_id, title, price, listing_url, first_seen, last_seen,
+                                 grade, parallel, is_lot, match_confidence)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(listing_id) DO UPDATE SET
+        price = excluded.price,
+        title = excluded.title,
+        last_seen = excluded.last_seen,
+        grade = excluded.grade,
+        parallel = excluded.parallel,
+        is_lot = excluded.is_lot,
+        match_confidence = excluded.match_confidence
+'''
+
+
+def fair_values(conn, as_of=None):
+    """Map card_id -> (fair_value, comp_count) for cards with active listings"""
+    today = to_day(as_of or date.today())
+    return {
+        card_id: (math.exp(level), sale_count)
+        for card_id, level, sale_count in conn.execute(MODELS_SQL, (MIN_COMPS, today - COMP_WINDOW_DAYS))
+    }
+
+
+def score_listings(conn, min_discount=0.0, limit=50, card_name=None, as_of=None):
+    """Rank active listings by discount to fair value, best deals first"""
+    values = fair_values(conn, as_of)
+    now = datetime.combine(as_of, datetime.min.time()) if as_of else datetime.utcnow()
+    rows = conn.execute(ACTIVE_SQL, (now.strftime('%Y-%m-%d %H:%M:%S'), f'-{ACTIVE_MAX_AGE_DAYS} days',
+                                     card_name, card_name)).fetchall()
+    if not rows or not values:
+        return []
+
+    card_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    prices = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+    # Dense lookup table from card_id to fair value; NaN where a card has too few comps
+    lookup = np.full(max(max(values), int(card_ids.max())) + 1, np.nan)
+    lookup[list(values)] = [value for value, _ in values.values()]
+    fair = lookup[card_ids]
+    discount = 1 - prices / fair
+
+    candidates = np.flatnonzero(~np.isnan(discount) & (discount >= min_discount))
+    ranked = candidates[np.argsort(-discount[candidates], kind='stable')][:limit]
+    results = []
+    for i in ranked:
+        listing_id, card_id, name, title, price, listing_url, last_seen = rows[i]
+        results.append({
+            'card_name': name,
+            'title': title,
+            'price': price,
+            'fair_value': round(float(fair[i]), 2),
+            'discount': round(float(discount[i]), 4),
+            'comps': values[card_id][1],
+            'listing_url': listing_url,
+            'last_seen': last_seen,
+        })
+    return results
+
+
+def store_active_listings(conn, card_name, items):
+    """Upsert one page of parsed active listings for a card, classifying their titles"""
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    items = [item for item in items if item[3]]
+    results = classifier.classify_titles(card_name, [title for title, *_ in items])
+    with conn:
+        card_id = get_card_id(conn, card_name)
+        rows = [
+            (normalize_listing_id(listing_url), card_id, title, price, listing_url, now, now, *result)
+            for (title, price, sale_date, listing_url), result in zip(items, results)
+        ]
+        conn.executemany(UPSERT_ACTIVE_SQL, rows)
+    return len(rows)
+
+
+def scrape_active_listings(queries, max_pages=3, engine=None, parser=None):
+    """Fetch current (unsold) listings for each card query and store them"""
+    conn = storage.connect()
+    own_engine = engine is None
+    engine = engine or ScrapeEngine()
+    active = [CardQuery(query.card_name, query.search_terms, sold=False) for query in queries]
+    stored = 0
+    try:
+        for query, page, items in engine.scrape(active, get_parser(parser), max_pages=max_pages):
+            stored += store_active_listings(conn, query.card_name, items)
+    finally:
+        conn.close()
+        if own_engine:
+            engine.close()
+    logger.info(f"Stored {stored} active listings for {len(active)} cards")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scrape', action='store_true', help="refresh the watchlist's active listings from eBay first")
+    parser.add_argument('--watchlist', default=None, help='watchlist file (default: $WATCHLIST_PATH or watchlist.toml)')
+    parser.add_argument('--max-pages', type=int, default=3)
+    parser.add_argument('--min-discount', type=float, default=0.2)
+    parser.add_argument('--limit', type=int, default=25)
+    parser.add_argument('--card', help='only score listings for this card name')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.scrape:
+        entries = load_watchlist(args.watchlist or WATCHLIST_PATH)
+        scrape_active_listings([entry.query for entry in entries], max_pages=args.max_pages)
+
+    conn = storage.connect()
+    deals = score_listings(conn, args.min_discount, args.limit, args.card)
+    conn.close()
+
+    print("UNDERVALUED LISTINGS")
+    print("=" * 50)
+    for deal in deals:
+        print(f"{deal['discount']:.0%} below fair value: ${deal['price']:.2f} vs ${deal['fair_value']:.2f} "
+              f"({deal['comps']} comps)")
+        print(f"   {deal['title']}")
+        print(f"   {deal['listing_url']}")
+    if not deals:
+        print("No listings below the discount threshold")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
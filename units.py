@@ -0,0 +1,36 @@
+"""Conversions between the compact stored forms and what the scraper and API deal in.
+
+Sales keep prices as integer cents and dates as integer days since 1970-01-01,
+which makes rows smaller, comparisons integer-only and sums exact.
+"""
+from datetime import date, datetime, timedelta
+
+EPOCH = date(1970, 1, 1)
+
+# SQL spellings of the same conversions, for queries and views
+DAY_TO_DATE_SQL = "date({} * 86400, 'unixepoch')"
+DATE_TO_DAY_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+
+def to_day(value):
+    """Epoch day for a date, datetime or ISO date string; None stays None"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    """date for an epoch day"""
+    return EPOCH + timedelta(days=int(day))
+
+
+def to_cents(price):
+    return int(round(price * 100))
+
+
+def from_cents(cents):
+    return cents / 100
@@ -0,0 +1,73 @@
+"""Load the card watchlist: which cards to scrape and how often.
+
+The watchlist is a TOML file (watchlist.toml by default, or $WATCHLIST_PATH); YAML
+with the same layout works too when PyYAML is installed:
+
+    [defaults]
+    refresh_hours = 6
+    max_pages = 5
+
+    [[cards]]
+    name = "victor wembanyama prizm #136 silver prizm psa 10 rc"
+    search_terms = "victor webanyama prizm #136 silver prizm psa 10 rc"
+    refresh_hours = 3
+"""
+import os
+import tomllib
+from collections import namedtuple
+
+from scrape_engine import CardQuery
+
+WATCHLIST_PATH = os.environ.get('WATCHLIST_PATH', 'watchlist.toml')
+
+DEFAULT_REFRESH_HOURS = 6
+DEFAULT_MAX_PAGES = 5
+
+# One watched card: its scrape query plus how often and how deep to scrape it
+WatchEntry = namedtuple('WatchEntry', ['query', 'refresh_hours', 'max_pages'])
+
+
+def _read(path):
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path} is YAML but PyYAML is not installed; use TOML or pip install pyyaml")
+        with open(path, encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def load_watchlist(path=None):
+    """Parse and validate a watchlist file into WatchEntry tuples, in file order"""
+    path = path or WATCHLIST_PATH
+    config = _read(path)
+    defaults = config.get('defaults', {})
+    refresh_default = float(defaults.get('refresh_hours', DEFAULT_REFRESH_HOURS))
+    pages_default = int(defaults.get('max_pages', DEFAULT_MAX_PAGES))
+
+    entries = []
+    names = set()
+    for i, card in enumerate(config.get('cards', []), start=1):
+        name = card.get('name')
+        if not name:
+            raise ValueError(f"{path}: card #{i} has no name")
+        if name in names:
+            raise ValueError(f"{path}: card '{name}' is listed twice")
+        names.add(name)
+        refresh_hours = float(card.get('refresh_hours', refresh_default))
+        if refresh_hours <= 0:
+            raise ValueError(f"{path}: card '{name}' needs a positive refresh_hours")
+        # Watched cards feed the sold-sales pipeline, which drops listings without a sale date
+        if card.get('sold', True) is not True:
+            raise ValueError(f"{path}: card '{name}' sets sold = false, but the watchlist only tracks sold "
+                             f"listings; active listings are fetched by undervalued.py --scrape")
+        entries.append(WatchEntry(
+            query=CardQuery(name, card.get('search_terms', name)),
+            refresh_hours=refresh_hours,
+            max_pages=int(card.get('max_pages', pages_default)),
+        ))
+    if not entries:
+        raise ValueError(f"{path}: no [[cards]] entries")
+    return entries